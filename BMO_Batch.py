@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+import json
+import logging
+import multiprocessing
+import os
+import shlex
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import click
+from click_command import click_config
+from core.environment import MAX_VALUE
+from core.Placement import PIN_CORES_ENV, THREADS_ENV, PlacementPolicy, apply_placement
+
+
+@click_config
+def target_runner_arguments(**kwargs):
+    """
+    Arguments accepted by BMO_CLI.py, used to parse every experiment of a batch.
+    """
+    return kwargs
+
+
+def read_experiments(experiments_file):
+    """
+    Reads the experiments of a race step. Each experiment holds the arguments irace
+    passes to BMO_CLI.py: "id_configuration id_instance seed instance parameters".
+
+    A text file has one experiment per line. A JSON file holds a list whose items
+    are either such a line or the list of its arguments.
+    """
+    with open(experiments_file, "r") as file:
+        if experiments_file.endswith(".json"):
+            experiments = json.load(file)
+        else:
+            experiments = [line for line in file.read().splitlines() if line.strip()]
+    return [
+        shlex.split(experiment) if isinstance(experiment, str) else experiment
+        for experiment in experiments
+    ]
+
+
+def parse_experiment(args):
+    try:
+        context = target_runner_arguments.make_context("BMO_CLI.py", list(args))
+    except click.ClickException as e:
+        logging.error(f"Invalid experiment arguments {args}: {e}")
+        return None
+    return context.params
+
+
+def evaluate_experiment(kwargs):
+    from core.SimulationRunner import evaluate
+
+    try:
+        return evaluate(kwargs)
+    except Exception as e:
+        logging.error(f"An error occurred evaluating the experiment: {e}")
+        return MAX_VALUE
+
+
+def initialize_worker(policy, slot_counter):
+    with slot_counter.get_lock():
+        slot = slot_counter.value
+        slot_counter.value += 1
+    apply_placement(policy, slot)
+
+
+def run_batch(experiments, workers, policy=None):
+    """
+    Evaluates every experiment on a local process pool and returns their costs in
+    order. The pool is forked after the models are built, so its workers inherit
+    them copy-on-write instead of building them again.
+
+    Each worker takes a placement slot of the policy, so with pinning enabled the
+    workers run on disjoint cores.
+    """
+    from core.PyBammWrapper import warm_up
+
+    policy = policy or PlacementPolicy.from_environment()
+    # Evaluations read the policy again from the environment
+    os.environ[THREADS_ENV] = str(policy.threads)
+    os.environ[PIN_CORES_ENV] = str(int(policy.pin_cores))
+    warm_up()
+    context = multiprocessing.get_context("fork")
+    slot_counter = context.Value("i", 0)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=initialize_worker,
+        initargs=(policy, slot_counter),
+    ) as executor:
+        futures = [
+            executor.submit(evaluate_experiment, kwargs) if kwargs else None
+            for kwargs in experiments
+        ]
+        results = []
+        for future in futures:
+            if future is None:
+                results.append(MAX_VALUE)
+                continue
+            try:
+                results.append(future.result())
+            except BrokenProcessPool as e:
+                logging.error(f"Worker pool failed: {e}")
+                results.append(MAX_VALUE)
+    return results
+
+
+@click.command()
+@click.option(
+    "--experiments_file",
+    required=True,
+    type=str,
+    help="File with one BMO_CLI.py argument line per experiment (text or JSON)",
+)
+@click.option(
+    "--workers",
+    default=os.cpu_count(),
+    type=int,
+    help="Number of experiments evaluated in parallel",
+)
+@click.option(
+    "--threads",
+    default=None,
+    type=int,
+    help="Threads per evaluation (defaults to BMO_THREADS_PER_EVALUATION or 1)",
+)
+@click.option(
+    "--pin_cores",
+    default=None,
+    type=bool,
+    help="Bind every worker to its own cores (defaults to BMO_PIN_CORES)",
+)
+@click.option("--log_path", default=None, type=str, help="Batch log file")
+def cli(experiments_file, workers, threads, pin_cores, log_path):
+    """
+    Batch target runner for irace (targetRunnerParallel): evaluates a whole race
+    step on this node and prints one cost per experiment, in the given order.
+    """
+    logging.basicConfig(
+        filename=log_path,
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+    experiments = [parse_experiment(args) for args in read_experiments(experiments_file)]
+    policy = PlacementPolicy.from_environment()
+    if threads is not None:
+        policy.threads = threads
+    if pin_cores is not None:
+        policy.pin_cores = pin_cores
+    logging.info(
+        f"Evaluating {len(experiments)} experiments on {workers} workers "
+        f"with {policy.threads} threads each"
+    )
+    results = run_batch(experiments, workers, policy)
+    sys.stdout = sys.__stdout__
+    sys.stderr = sys.__stderr__
+    for result in results:
+        print(result)
+
+
+if __name__ == "__main__":
+    cli()
+    sys.exit(0)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import logging
+import os
+import shlex
+import sys
+
+import click
+from BMO_Batch import parse_experiment
+from core.SimulationDaemon import DAEMON_SOCKET_ENV, SimulationDaemon
+
+
+def read_instances(instances_file, base_param_path=None):
+    """
+    Reads an irace instances file, one line of BMO_CLI.py instance arguments per
+    instance, and returns the arguments of each, with base_param_path unless the
+    line sets its own.
+    """
+    instances = []
+    with open(instances_file, "r") as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            args = ["warm_up", "warm_up", "0", *shlex.split(line)]
+            if base_param_path and "--base_param_path" not in line:
+                args += ["--base_param_path", base_param_path]
+            kwargs = parse_experiment(args)
+            if kwargs is not None:
+                instances.append(kwargs)
+    return instances
+
+
+@click.command()
+@click.option(
+    "--socket_path",
+    default=DAEMON_SOCKET_ENV,
+    help="Environment variable with the path of the Unix socket to listen on",
+)
+@click.option(
+    "--max_children",
+    default=None,
+    type=int,
+    help="Maximum number of concurrent evaluations (defaults to the number of cores)",
+)
+@click.option(
+    "--instances_file",
+    default=None,
+    type=str,
+    help="irace instances file whose experiments, simulations and experimental data "
+    "are warmed up before serving",
+)
+@click.option(
+    "--base_param_path",
+    default=None,
+    type=str,
+    help="Param file the simulations of the instances are built with, unless their "
+    "line sets one",
+)
+@click.option("--log_path", default=None, type=str, help="Daemon log file")
+def cli(socket_path, max_children, instances_file, base_param_path, log_path):
+    """
+    Starts the per-node simulation daemon used by BMO_CLI.py.
+
+    PyBaMM, the parameter sets and the models are loaded once, and every request
+    is served by a child forked from this warm process. With an instances file, the
+    experiments and experimental data of every instance, up to its cycle, and its
+    simulations are loaded and built too.
+    """
+    socket_path = os.getenv(socket_path)
+    if socket_path is None:
+        print(f"Socket path environment variable not set", file=sys.stderr)
+        sys.exit(1)
+    logging.basicConfig(
+        filename=log_path,
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+    with SimulationDaemon(socket_path, max_children=max_children) as daemon:
+        daemon.warm_up(
+            read_instances(instances_file, base_param_path) if instances_file else None
+        )
+        daemon.activate()
+        logging.info(f"Simulation daemon listening on {socket_path}")
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            logging.info("Simulation daemon stopped")
+
+
+if __name__ == "__main__":
+    cli()
+    sys.exit(0)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+import logging
+import os
+import shlex
+import sys
+
+import click
+from BMO_Batch import parse_experiment
+from core.environment import setup_paths
+from core.Refinement import PARAMETERS_FILE, Refinement, read_parameter_ranges
+from core.SimulationRunner import initialize_pybamm_wrapper
+
+
+def get_ranges(parameters, parameters_file):
+    """
+    Ranges of the parameters to tune, from the irace parameters file.
+    """
+    available = read_parameter_ranges(parameters_file)
+    names = [name.strip() for name in parameters.split(",") if name.strip()]
+    missing = [name for name in names if name not in available]
+    if missing:
+        raise click.BadParameter(
+            f"No range in {parameters_file} for {', '.join(missing)}",
+            param_hint="--parameters",
+        )
+    return {name: available[name] for name in names}
+
+
+@click.command()
+@click.option(
+    "--experiment",
+    required=True,
+    type=str,
+    help="BMO_CLI.py arguments of the elite, with its --base_param_path",
+)
+@click.option(
+    "--parameters",
+    required=True,
+    type=str,
+    help="Comma separated options of the parameters to tune, e.g. "
+    "negative_electrode_porosity,positive_electrode_porosity",
+)
+@click.option(
+    "--parameters_file",
+    default=PARAMETERS_FILE,
+    type=str,
+    help="irace parameters file with the range of every parameter",
+)
+@click.option(
+    "--battery_ids",
+    default=None,
+    type=str,
+    help="Comma separated batteries to fit, the one of the experiment by default",
+)
+@click.option(
+    "--cycles",
+    default=None,
+    type=str,
+    help="Comma separated cycles to fit, the --n_cycle of the experiment by default",
+)
+@click.option(
+    "--diff_step",
+    default=0.01,
+    type=float,
+    help="Finite difference step, as a share of the parameter ranges",
+)
+@click.option(
+    "--max_evaluations",
+    default=20,
+    type=int,
+    help="Maximum residual evaluations, finite differences not included",
+)
+@click.option("--output", required=True, type=str, help="Refined param.json to write")
+@click.option("--log_path", default=None, type=str, help="Refinement log file")
+def main(
+    experiment,
+    parameters,
+    parameters_file,
+    battery_ids,
+    cycles,
+    diff_step,
+    max_evaluations,
+    output,
+    log_path,
+):
+    """
+    Refines an elite configuration with a bounded least-squares fit of the voltage
+    and current residuals of the non-degradation metric, starting from its param
+    file, and writes the refined parameters to a new param file.
+    """
+    logging.basicConfig(
+        filename=log_path,
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+    if os.path.exists(output):
+        print(f"{output} already exists", file=sys.stderr)
+        sys.exit(1)
+    kwargs = parse_experiment(shlex.split(experiment))
+    if kwargs is None:
+        sys.exit(1)
+    ranges = get_ranges(parameters, parameters_file)
+    # Every evaluation is simulated: cached states don't keep the outputs
+    kwargs = dict(kwargs, save_param=False, cache_path=None)
+
+    _, parameter_file_path, result_path, state_path, _ = setup_paths(kwargs)
+    elite, template = initialize_pybamm_wrapper(
+        parameter_file_path, result_path, state_path, kwargs
+    )
+    refinement = Refinement(
+        template=template,
+        elite=elite,
+        ranges=ranges,
+        batteries=battery_ids.split(",") if battery_ids else [kwargs["battery_id"]],
+        cycles=(
+            [int(cycle) for cycle in cycles.split(",")]
+            if cycles
+            else [int(kwargs["n_cycle"])]
+        ),
+    )
+    result = refinement.run(diff_step=diff_step, max_evaluations=max_evaluations)
+    result.model_parameters.save_param(output)
+
+    sys.stdout = sys.__stdout__
+    initial_values = refinement.get_elite_values()
+    print(f"{'parameter':>45} {'elite':>12} {'refined':>12}")
+    for name, value in result.values.items():
+        print(f"{name:>45} {initial_values[name]:>12.6g} {value:>12.6g}")
+    print(f"\nRMSE: {result.initial_rmse:.6g} -> {result.rmse:.6g}")
+    print(f"Evaluations: {result.evaluations} ({result.message})")
+
+
+if __name__ == "__main__":
+    main()
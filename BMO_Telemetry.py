@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+import click
+import pandas as pd
+from core.Telemetry import TELEMETRY_PATH_ENV, read_records
+
+# Stages spanning other stages, left out of the share of the total time
+ENVELOPE_STAGES = ["evaluation", "cycle"]
+
+
+def summarize(records, by):
+    """
+    Aggregates the duration of the records per group: number of records, total hours,
+    mean, median and maximum seconds, failures and share of the total time.
+
+    Raises:
+    - ValueError: If by does not include stage, needed to leave the envelope
+      stages out of the share of the total time.
+    """
+    if "stage" not in by:
+        raise ValueError("The records must be grouped by stage")
+    df = pd.DataFrame.from_records(records)
+    for column in by:
+        if column not in df:
+            df[column] = None
+    df[by] = df[by].fillna("-")
+    if "success" not in df:
+        df["success"] = True
+    df["failed"] = df["success"] == False  # noqa: E712
+    summary = df.groupby(by).agg(
+        count=("duration", "size"),
+        total_h=("duration", lambda d: d.sum() / 3600),
+        mean_s=("duration", "mean"),
+        median_s=("duration", "median"),
+        max_s=("duration", "max"),
+        failed=("failed", "sum"),
+    )
+    is_envelope = summary.index.get_level_values("stage").isin(ENVELOPE_STAGES)
+    stages_total = summary.loc[~is_envelope, "total_h"].sum()
+    summary["share_%"] = 100 * summary["total_h"] / stages_total
+    summary.loc[is_envelope, "share_%"] = float("nan")
+    return summary.sort_values("total_h", ascending=False)
+
+
+@click.command()
+@click.option(
+    "--telemetry_path",
+    default=TELEMETRY_PATH_ENV,
+    help="Folder of the telemetry records, or environment variable holding it",
+)
+@click.option(
+    "--by",
+    default="stage,experiment",
+    help="Comma separated record keys to group by, including stage (e.g. "
+    "stage,battery)",
+)
+@click.option("--output", default=None, type=str, help="Also save the summary as CSV")
+def cli(telemetry_path, by, output):
+    """
+    Summarizes the per-stage timing records of a campaign.
+    """
+    by = [column for column in by.split(",") if column]
+    if "stage" not in by:
+        raise click.BadParameter("must include stage", param_hint="--by")
+    telemetry_path = os.getenv(telemetry_path, telemetry_path)
+    if not os.path.isdir(telemetry_path):
+        print(f"Telemetry folder {telemetry_path} not found", file=sys.stderr)
+        sys.exit(1)
+    records = read_records(telemetry_path)
+    if not records:
+        print(f"No telemetry records found in {telemetry_path}", file=sys.stderr)
+        sys.exit(1)
+    summary = summarize(records, by)
+    with pd.option_context(
+        "display.max_rows", None, "display.max_columns", None, "display.width", 200
+    ):
+        print(summary.round(3))
+    if output:
+        summary.to_csv(output)
+
+
+if __name__ == "__main__":
+    cli()
+    sys.exit(0)
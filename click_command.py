@@ -45,11 +45,153 @@ def click_config(func):
             default="EV_DATAPATH",
             help="Path where file with battery data is located",
         ),
+        click.option(
+            "--columnar_path",
+            default="BMO_COLUMNAR_PATH",
+            help="Environment variable with the columnar copy of the dataset, read "
+            "instead of its HDF5 groups when set",
+        ),
         click.option(
             "--inputs_path",
             default="INPUTS_PATH",
             help="Path where state and param",
         ),
+        click.option(
+            "--daemon_socket",
+            default="BMO_DAEMON_SOCKET",
+            help="Environment variable with the Unix socket of the simulation daemon",
+        ),
+        click.option(
+            "--cache_path",
+            default="BMO_CACHE_PATH",
+            help="Environment variable with the path of the shared simulation cache",
+        ),
+        click.option(
+            "--drive_cycle_path",
+            default="UDDS_PROFILE_PATH",
+            help="Environment variable with the path of the drive cycle current profile",
+        ),
+        click.option(
+            "--telemetry_path",
+            default="BMO_TELEMETRY_PATH",
+            help="Environment variable with the folder of the per-stage timing records",
+        ),
+        click.option(
+            "--cost_bound",
+            default=None,
+            type=float,
+            help="Stop early and return a censored cost when the mean cost of the "
+            "cycles simulated so far exceeds this bound by 10%, which predicts that "
+            "the requested cycle won't beat it (defaults to the BMO_COST_BOUND "
+            "environment variable)",
+        ),
+        click.option(
+            "--censored_cost",
+            default=None,
+            type=click.Choice(["bound", "inf"], case_sensitive=False),
+            help="Cost returned by runs stopped by --cost_bound: the largest of the "
+            "bound and their partial cost (bound) or Inf (inf). Defaults to the "
+            "BMO_CENSORED_COST environment variable, else inf",
+        ),
+        click.option(
+            "--solver",
+            default=None,
+            type=str,
+            help="Solver backend: casadi_safe (default), casadi_fast_events or idaklu. "
+            "Overrides the solver key of the param file",
+        ),
+        click.option(
+            "--fidelity",
+            default=None,
+            type=click.Choice(["low", "high", "spme", "auto"], case_sensitive=False),
+            help="Coarse (low) or full (high) mesh and tolerances, the SPMe model "
+            "(spme), or auto to confirm at high fidelity the low fidelity costs under "
+            "--fidelity_threshold (defaults to the BMO_FIDELITY environment variable, "
+            "else high)",
+        ),
+        click.option(
+            "--fidelity_threshold",
+            default=None,
+            type=float,
+            help="Low fidelity cost under which auto mode escalates, required by auto "
+            "(defaults to the BMO_FIDELITY_THRESHOLD environment variable)",
+        ),
+        click.option(
+            "--capacity_schedule",
+            default=None,
+            type=click.Choice(["always", "available"], case_sensitive=False),
+            help="Run the simulated capacity test on every cycle (always) or only on "
+            "cycles with an experimental capacity test (available). Defaults to the "
+            "BMO_CAPACITY_SCHEDULE environment variable, else always",
+        ),
+        click.option(
+            "--capacity_cadence",
+            default=None,
+            type=int,
+            help="With --capacity_schedule available, also run the capacity test every "
+            "N cycles to refresh the SoC normalisation (defaults to the "
+            "BMO_CAPACITY_CADENCE environment variable, else 0: disabled)",
+        ),
+        click.option(
+            "--concurrent_capacity",
+            default=None,
+            type=bool,
+            help="Solve the capacity test in a separate process while the main cycle "
+            "runs with the previous SoC normalisation (defaults to the "
+            "BMO_CONCURRENT_CAPACITY environment variable, else false)",
+        ),
+        click.option(
+            "--cycles_per_solve",
+            default=None,
+            type=int,
+            help="Main cycles solved together in a single experiment (defaults to the "
+            "BMO_CYCLES_PER_SOLVE environment variable, else 1)",
+        ),
+        click.option(
+            "--prescreen_threshold",
+            default=None,
+            type=float,
+            help="Evaluate the configuration with the SPMe first and reject it without "
+            "running the DFN when its cost exceeds this threshold (defaults to the "
+            "BMO_PRESCREEN_THRESHOLD environment variable, else no pre-screen)",
+        ),
+        click.option(
+            "--prescreen_penalty",
+            default=None,
+            type=float,
+            help="Return the SPMe cost times this penalty for rejected configurations "
+            "instead of Inf (defaults to the BMO_PRESCREEN_PENALTY environment variable)",
+        ),
+        click.option(
+            "--drive_cycle_mode",
+            default=None,
+            type=click.Choice(["tiled", "periodic"], case_sensitive=False),
+            help="Represent the drive cycle step as the profile tiled over the whole "
+            "step (tiled) or as one period evaluated modulo its length (periodic). "
+            "Defaults to the BMO_DRIVE_CYCLE_MODE environment variable, else tiled",
+        ),
+        click.option(
+            "--drive_cycle_tolerance",
+            default=None,
+            type=float,
+            help="In periodic mode, drop the profile breakpoints reproduced within this "
+            "current [A] by the others (defaults to the BMO_DRIVE_CYCLE_TOLERANCE "
+            "environment variable, else 0: keep them all)",
+        ),
+        click.option(
+            "--drive_cycle_smoothing",
+            default=None,
+            type=float,
+            help="In periodic mode, moving average width [s] applied to the profile "
+            "(defaults to the BMO_DRIVE_CYCLE_SMOOTHING environment variable, else 0)",
+        ),
+        click.option(
+            "--drive_cycle_sampling",
+            default=None,
+            type=float,
+            help="In periodic mode, time [s] between solution points (defaults to the "
+            "BMO_DRIVE_CYCLE_SAMPLING environment variable, else the profile step)",
+        ),
         click.option(
             "--verbose",
             default=False,
@@ -0,0 +1,77 @@
+import os
+from dataclasses import asdict, dataclass
+from typing import Optional, Set
+
+CAPACITY_SCHEDULE_ENV = "BMO_CAPACITY_SCHEDULE"
+CAPACITY_CADENCE_ENV = "BMO_CAPACITY_CADENCE"
+CONCURRENT_CAPACITY_ENV = "BMO_CONCURRENT_CAPACITY"
+# Runs the simulated capacity test before every cycle
+SCHEDULE_ALWAYS = "always"
+# Runs it only on the cycles with an experimental capacity test to compare with
+SCHEDULE_AVAILABLE = "available"
+SCHEDULE_MODES = [SCHEDULE_ALWAYS, SCHEDULE_AVAILABLE]
+
+
+@dataclass
+class CapacitySchedule:
+    """
+    Decides on which cycles the simulated capacity test runs before the main
+    experiment. The test gives the capacity metric and the SoC normalisation of the
+    main experiment; cycles without it reuse the last normalisation.
+
+    Attributes:
+        mode (str): "always" or "available".
+        cadence (int): In "available" mode, also runs the test every cadence cycles
+            to refresh the SoC normalisation. 0 disables it.
+        concurrent (bool): Runs the test in a separate process alongside the main
+            experiment, which then uses the normalisation of the previous test.
+    """
+
+    mode: str = SCHEDULE_ALWAYS
+    cadence: int = 0
+    concurrent: bool = False
+
+    def __post_init__(self):
+        if self.mode not in SCHEDULE_MODES:
+            raise ValueError(
+                f"Unknown capacity schedule {self.mode}, available: "
+                f"{', '.join(SCHEDULE_MODES)}"
+            )
+
+    @classmethod
+    def from_kwargs(cls, kwargs) -> "CapacitySchedule":
+        """
+        Reads --capacity_schedule, --capacity_cadence and --concurrent_capacity,
+        falling back to the BMO_CAPACITY_SCHEDULE, BMO_CAPACITY_CADENCE and
+        BMO_CONCURRENT_CAPACITY environment variables.
+        """
+        mode = kwargs.get("capacity_schedule") or os.getenv(
+            CAPACITY_SCHEDULE_ENV, SCHEDULE_ALWAYS
+        )
+        cadence = kwargs.get("capacity_cadence")
+        if cadence is None:
+            cadence = os.getenv(CAPACITY_CADENCE_ENV, 0)
+        concurrent = kwargs.get("concurrent_capacity")
+        if concurrent is None:
+            concurrent = os.getenv(CONCURRENT_CAPACITY_ENV, "0").lower() in (
+                "1",
+                "true",
+                "yes",
+            )
+        return cls(mode=mode.lower(), cadence=int(cadence), concurrent=concurrent)
+
+    def runs_capacity_test(self, cycle: int, available_cycles: Optional[Set[int]]) -> bool:
+        """
+        Parameters:
+        - cycle: The cycle about to be simulated.
+        - available_cycles: Cycles with an experimental capacity test, None if the
+          dataset can't tell.
+        """
+        if self.mode == SCHEDULE_ALWAYS or available_cycles is None:
+            return True
+        if self.cadence > 0 and cycle % self.cadence == 0:
+            return True
+        return cycle in available_cycles
+
+    def to_dict(self) -> dict:
+        return asdict(self)
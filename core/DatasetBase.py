@@ -2,7 +2,7 @@ import logging
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from enum import Enum, auto
-from typing import Dict, Optional, Tuple
+from typing import Dict, Optional, Set, Tuple
 
 import numpy as np
 import pandas as pd
@@ -23,14 +23,23 @@ class Experiments:
     capacity: pybamm.Experiment
 
 
-def SoC_termination(threshold):
-    SoC_init = 1
+@dataclass
+class SoCEvent:
+    """
+    Event function of SoC_termination. A module-level class instead of a closure,
+    so experiments using it can be pickled with their simulations.
+    """
+
+    threshold: float
+    SoC_init: float = 1
+
+    def __call__(self, variables):
+        return (self.SoC_init - variables["SoC"]) - self.threshold
 
-    def SoC(variables):
-        return (SoC_init - variables["SoC"]) - threshold
 
+def SoC_termination(threshold):
     return pybamm.step.CustomTermination(
-        name=f"State of Charge Threshold {threshold}", event_function=SoC
+        name=f"State of Charge Threshold {threshold}", event_function=SoCEvent(threshold)
     )
 
 
@@ -52,6 +61,8 @@ class DatasetID(Enum):
 
     @classmethod
     def get_dataset_id(cls, database_string_id):
+        if isinstance(database_string_id, DatasetID):
+            return database_string_id
         if database_string_id == "EV":
             return DatasetID.Dataset_EV
         else:
@@ -80,6 +91,20 @@ class AbstractBaseDataset(ABC):
         """
         pass
 
+    def get_capacity_test_cycles(self) -> Optional[Set[int]]:
+        """
+        Cycles with an experimental capacity test, or None if the dataset can't tell,
+        in which case the simulated capacity test runs on every cycle.
+        """
+        return None
+
+    def warm_up(self, cycles: int):
+        """
+        Reads the experimental data of cycles 0 to cycles ahead of their use, for the
+        datasets that keep it in memory.
+        """
+        pass
+
     @abstractmethod
     def save_results(self, output: PybammOutput, n_cycle):
         """
@@ -96,6 +121,16 @@ class AbstractBaseDataset(ABC):
         """
         pass
 
+    def get_residuals_non_degradation(
+        self, output: PybammOutput, n_cycle
+    ) -> Optional[np.ndarray]:
+        """
+        Residuals between the simulation and the experimental data that the
+        non-degradation metric compares, used by the local refinement, or None if the
+        dataset doesn't provide them.
+        """
+        return None
+
     @abstractmethod
     def get_metric_capacity_experiment(
         self, output: PybammOutput, n_cycle
@@ -0,0 +1,156 @@
+import os
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import numpy as np
+import pybamm
+
+DRIVE_CYCLE_MODE_ENV = "BMO_DRIVE_CYCLE_MODE"
+DRIVE_CYCLE_TOLERANCE_ENV = "BMO_DRIVE_CYCLE_TOLERANCE"
+DRIVE_CYCLE_SMOOTHING_ENV = "BMO_DRIVE_CYCLE_SMOOTHING"
+DRIVE_CYCLE_SAMPLING_ENV = "BMO_DRIVE_CYCLE_SAMPLING"
+# The profile repeated as many times as the experiment needs, as one array
+MODE_TILED = "tiled"
+# A single period of the profile, evaluated modulo its length
+MODE_PERIODIC = "periodic"
+DRIVE_CYCLE_MODES = [MODE_TILED, MODE_PERIODIC]
+
+
+@dataclass
+class DriveCycle:
+    """
+    How the main experiment represents the drive cycle current profile.
+
+    Attributes:
+        mode (str): "tiled" or "periodic".
+        tolerance (float): In periodic mode, removes the breakpoints of the period
+            that linear interpolation between the others reproduces within this
+            current [A]. 0 keeps them all.
+        smoothing (float): In periodic mode, width [s] of the circular moving average
+            applied to the period before decimating it. 0 disables it.
+        sampling (Optional[float]): In periodic mode, time [s] between the points of
+            the solution, the time step of the profile by default.
+    """
+
+    mode: str = MODE_TILED
+    tolerance: float = 0.0
+    smoothing: float = 0.0
+    sampling: Optional[float] = None
+
+    def __post_init__(self):
+        if self.mode not in DRIVE_CYCLE_MODES:
+            raise ValueError(
+                f"Unknown drive cycle mode {self.mode}, available: "
+                f"{', '.join(DRIVE_CYCLE_MODES)}"
+            )
+
+    @classmethod
+    def from_kwargs(cls, kwargs) -> "DriveCycle":
+        """
+        Reads --drive_cycle_mode, --drive_cycle_tolerance, --drive_cycle_smoothing
+        and --drive_cycle_sampling, falling back to the BMO_DRIVE_CYCLE_MODE,
+        BMO_DRIVE_CYCLE_TOLERANCE, BMO_DRIVE_CYCLE_SMOOTHING and
+        BMO_DRIVE_CYCLE_SAMPLING environment variables.
+        """
+        mode = kwargs.get("drive_cycle_mode") or os.getenv(
+            DRIVE_CYCLE_MODE_ENV, MODE_TILED
+        )
+        values = {}
+        for name, env in [
+            ("tolerance", DRIVE_CYCLE_TOLERANCE_ENV),
+            ("smoothing", DRIVE_CYCLE_SMOOTHING_ENV),
+            ("sampling", DRIVE_CYCLE_SAMPLING_ENV),
+        ]:
+            value = kwargs.get(f"drive_cycle_{name}")
+            if value is None:
+                value = os.getenv(env)
+            if value is not None:
+                values[name] = float(value)
+        return cls(mode=mode.lower(), **values)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def get_step(
+        self, profile: np.ndarray, repetitions: int, termination=None
+    ) -> pybamm.step._Step:
+        """
+        Current step following a drive cycle profile repeated several times.
+
+        Parameters:
+        - profile: Two columns array with one period of the profile, the time [s]
+          evenly spaced from 0 and the current [A].
+        - repetitions: Times the profile is repeated.
+        - termination: Termination of the step.
+        """
+        dt = profile[1, 0] - profile[0, 0]
+        if self.mode == MODE_TILED:
+            n = len(profile) * repetitions
+            tiled = np.column_stack(
+                [profile[0, 0] + dt * np.arange(n), np.tile(profile[:, 1], repetitions)]
+            )
+            return pybamm.step.current(tiled, termination=termination)
+
+        # The period is closed with its first point, so it wraps around continuously
+        period_length = profile[-1, 0] + dt
+        current = smooth_periodic(profile[:, 1], int(round(self.smoothing / dt)))
+        t = np.append(profile[:, 0], period_length)
+        current = np.append(current, current[0])
+        keep = decimate(t, current, self.tolerance)
+        value = pybamm.Interpolant(
+            t[keep],
+            current[keep],
+            pybamm.Modulo(
+                pybamm.t - pybamm.InputParameter("start time"),
+                pybamm.Scalar(period_length),
+            ),
+            name="periodic drive cycle",
+        )
+        # Same end as the tiled profile, whose last point is one step before
+        return pybamm.step.current(
+            value,
+            duration=period_length * repetitions - dt,
+            period=self.sampling or dt,
+            termination=termination,
+        )
+
+
+def smooth_periodic(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Circular moving average of a periodic signal over window samples.
+    """
+    if window <= 1:
+        return values
+    before, after = window // 2, window - 1 - window // 2
+    padded = np.concatenate([values[len(values) - before :], values, values[:after]])
+    return np.convolve(padded, np.ones(window) / window, mode="valid")
+
+
+def decimate(t: np.ndarray, values: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Ramer-Douglas-Peucker selection of the breakpoints of a piecewise linear signal:
+    the removed points are within tolerance of the interpolation between the kept
+    ones. The first and last points are always kept.
+
+    Returns:
+    - np.ndarray: Boolean mask of the kept points.
+    """
+    keep = np.zeros(len(t), dtype=bool)
+    keep[[0, -1]] = True
+    if tolerance <= 0:
+        keep[:] = True
+        return keep
+    segments = [(0, len(t) - 1)]
+    while segments:
+        start, end = segments.pop()
+        if end - start < 2:
+            continue
+        inner = slice(start + 1, end)
+        line = np.interp(t[inner], t[[start, end]], values[[start, end]])
+        errors = np.abs(values[inner] - line)
+        worst = int(np.argmax(errors))
+        if errors[worst] > tolerance:
+            split = start + 1 + worst
+            keep[split] = True
+            segments += [(start, split), (split, end)]
+    return keep
@@ -0,0 +1,171 @@
+import logging
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+from core.MetricsIndex import lookup_metric
+
+FIDELITY_ENV = "BMO_FIDELITY"
+FIDELITY_THRESHOLD_ENV = "BMO_FIDELITY_THRESHOLD"
+PRESCREEN_THRESHOLD_ENV = "BMO_PRESCREEN_THRESHOLD"
+PRESCREEN_PENALTY_ENV = "BMO_PRESCREEN_PENALTY"
+FIDELITY_LOW = "low"
+FIDELITY_HIGH = "high"
+# Reduced order model used to pre-screen configurations before the DFN
+FIDELITY_SPME = "spme"
+# Screens at low fidelity and confirms at high fidelity the costs under the threshold
+FIDELITY_AUTO = "auto"
+FIDELITY_MODES = [FIDELITY_LOW, FIDELITY_HIGH, FIDELITY_SPME, FIDELITY_AUTO]
+
+
+@dataclass(frozen=True)
+class FidelityLevel:
+    """
+    Model, discretization and solver accuracy of the evaluations at one fidelity.
+
+    Attributes:
+        var_pts (dict): Mesh points of the electrodes, separator and particles.
+        tolerance (float): Absolute and relative solver tolerance without degradation.
+        degradation_tolerance (float): Solver tolerance with degradation.
+        model (str): PyBaMM lithium-ion model, see PyBammWrapper.MODELS.
+    """
+
+    var_pts: dict = field(hash=False)
+    tolerance: float
+    degradation_tolerance: float
+    model: str = "DFN"
+
+
+FIDELITY_LEVELS = {
+    FIDELITY_LOW: FidelityLevel(
+        var_pts={"x_n": 3, "x_s": 3, "x_p": 3, "r_n": 10, "r_p": 10},
+        tolerance=1e-3,
+        degradation_tolerance=1e-5,
+    ),
+    FIDELITY_HIGH: FidelityLevel(
+        var_pts={"x_n": 5, "x_s": 5, "x_p": 5, "r_n": 30, "r_p": 30},
+        tolerance=1e-4,
+        degradation_tolerance=1e-6,
+    ),
+    FIDELITY_SPME: FidelityLevel(
+        var_pts={"x_n": 5, "x_s": 5, "x_p": 5, "r_n": 30, "r_p": 30},
+        tolerance=1e-4,
+        degradation_tolerance=1e-6,
+        model="SPMe",
+    ),
+}
+
+
+def get_fidelity_mode(kwargs) -> str:
+    """
+    Returns the fidelity requested with --fidelity or BMO_FIDELITY, high by default.
+
+    Raises:
+    - ValueError: If the fidelity is unknown, or auto without an escalation
+      threshold.
+    """
+    fidelity = kwargs.get("fidelity") or os.getenv(FIDELITY_ENV) or FIDELITY_HIGH
+    fidelity = fidelity.lower()
+    if fidelity not in FIDELITY_MODES:
+        raise ValueError(
+            f"Unknown fidelity {fidelity}, available: {', '.join(FIDELITY_MODES)}"
+        )
+    if fidelity == FIDELITY_AUTO and get_fidelity_threshold(kwargs) is None:
+        raise ValueError(
+            f"Fidelity {FIDELITY_AUTO} needs --fidelity_threshold or "
+            f"{FIDELITY_THRESHOLD_ENV}"
+        )
+    return fidelity
+
+
+def get_fidelity_threshold(kwargs) -> Optional[float]:
+    """
+    Returns the low fidelity cost under which auto mode escalates to high fidelity,
+    from --fidelity_threshold or BMO_FIDELITY_THRESHOLD, which auto mode requires.
+    """
+    threshold = kwargs.get("fidelity_threshold")
+    if threshold is None:
+        threshold = os.getenv(FIDELITY_THRESHOLD_ENV)
+    return None if threshold is None else float(threshold)
+
+
+def get_state_fidelity(fidelity: str) -> Optional[str]:
+    """
+    Suffix of the state files of an evaluation in this fidelity mode. High fidelity
+    states keep the original file names, and auto mode answers with them once they
+    exist.
+    """
+    return None if fidelity in (FIDELITY_HIGH, FIDELITY_AUTO) else fidelity
+
+
+def get_prescreen_threshold(kwargs) -> Optional[float]:
+    """
+    Returns the SPMe cost above which a configuration is rejected without running
+    the DFN, from --prescreen_threshold or BMO_PRESCREEN_THRESHOLD. None disables
+    the pre-screen.
+    """
+    threshold = kwargs.get("prescreen_threshold")
+    if threshold is None:
+        threshold = os.getenv(PRESCREEN_THRESHOLD_ENV)
+    return None if threshold is None else float(threshold)
+
+
+def get_prescreen_cost(screen_cost, kwargs) -> Optional[str]:
+    """
+    Returns the cost of a configuration rejected by the pre-screen, or None if its
+    SPMe cost passes it. Rejected configurations cost Inf, or their SPMe cost times
+    --prescreen_penalty (BMO_PRESCREEN_PENALTY) when given, which keeps them ranked.
+    Configurations whose SPMe evaluation failed are rejected with Inf.
+    """
+    threshold = get_prescreen_threshold(kwargs)
+    if threshold is None:
+        return None
+    if screen_cost is not None and not math.isinf(float(screen_cost)):
+        if float(screen_cost) <= threshold:
+            return None
+        penalty = kwargs.get("prescreen_penalty")
+        if penalty is None:
+            penalty = os.getenv(PRESCREEN_PENALTY_ENV)
+        if penalty is not None:
+            return f"{float(screen_cost) * float(penalty)}"
+    return "Inf"
+
+
+def should_escalate(low_cost, threshold: Optional[float]) -> bool:
+    """
+    Whether a low fidelity cost is promising enough to be confirmed at high fidelity.
+    Failed evaluations, and any evaluation without a threshold, are never escalated.
+    """
+    if threshold is None or low_cost is None or math.isinf(float(low_cost)):
+        return False
+    return float(low_cost) < threshold
+
+
+def lookup_fidelity_metric(
+    state_path: str,
+    low_state_path: str,
+    cycle: int,
+    fidelity: str,
+    threshold: Optional[float],
+) -> Tuple[bool, Optional[float]]:
+    """
+    Looks up an already simulated cycle in the metrics index of the fidelity of the
+    evaluation. In auto mode, the high fidelity metric is preferred and the low
+    fidelity one is only final when it would not be escalated.
+
+    Parameters:
+    - state_path: State path of the evaluation's fidelity (high in auto mode).
+    - low_state_path: State path of the low fidelity evaluations.
+    - cycle: The cycle to look up.
+    - fidelity: The fidelity mode of the evaluation.
+    - threshold: Escalation threshold of auto mode.
+    """
+    simulated, metric = lookup_metric(state_path, cycle)
+    if simulated or fidelity != FIDELITY_AUTO:
+        return simulated, metric
+    simulated, metric = lookup_metric(low_state_path, cycle)
+    if simulated and not should_escalate(metric, threshold):
+        logging.info(f"Cycle {cycle} found at low fidelity: {metric}")
+        return True, metric
+    return False, None
@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass
+class MetricsIndex:
+    """
+    Lightweight per-configuration copy of the metrics stored in the state file.
+
+    The state file pickles PyBaMM solutions, so reading it requires importing PyBaMM.
+    This index only holds the metrics of every simulated cycle as JSON, which lets
+    BMO_CLI.py answer already simulated cycles without touching the model.
+
+    Runs stopped early by a cost bound are recorded in censored by requested cycle,
+    with the cycle they stopped after, their partial cost, the bound and the cost
+    reported, until that cycle is simulated.
+    """
+
+    degradation: bool
+    metrics: List[dict] = field(default_factory=list)
+    censored: Dict[str, dict] = field(default_factory=dict)
+
+    @staticmethod
+    def get_path(state_path: str) -> str:
+        return f"{state_path}_metrics.json"
+
+    @classmethod
+    def from_state(cls, state, degradation: bool) -> "MetricsIndex":
+        metrics = [
+            {key: _to_json_value(value) for key, value in info.to_dict().items()}
+            for info in state.array_pybamm_metric
+        ]
+        return cls(degradation=degradation, metrics=metrics)
+
+    def __len__(self):
+        return len(self.metrics)
+
+    def get_metric(self, cycle: int) -> Tuple[bool, Optional[float]]:
+        """
+        Returns whether the cycle has been simulated and, if so, the metric used as
+        cost for the configuration mode (degradation or non-degradation).
+        """
+        if not 0 <= cycle < len(self.metrics):
+            return False, None
+        key = "degradation_metrics" if self.degradation else "non_degradation_metric"
+        return True, self.metrics[cycle].get(key)
+
+    def save(self, index_path: str):
+        """
+        Writes the index atomically, so concurrent readers never see a partial file.
+        The censored runs of the index it replaces are kept until their requested
+        cycle is simulated.
+        """
+        previous = MetricsIndex.read(index_path)
+        censored = {} if previous is None else previous.censored
+        censored = {
+            cycle: record
+            for cycle, record in {**censored, **self.censored}.items()
+            if int(cycle) >= len(self.metrics)
+        }
+        data = {
+            "degradation": self.degradation,
+            "metrics": self.metrics,
+            "censored": censored,
+        }
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(data, file)
+        os.replace(tmp_path, index_path)
+
+    @classmethod
+    def read(cls, index_path: str) -> Optional["MetricsIndex"]:
+        index_file = Path(index_path)
+        if not index_file.exists():
+            return None
+        try:
+            with index_file.open("r") as file:
+                data = json.load(file)
+            return cls(
+                degradation=data["degradation"],
+                metrics=data["metrics"],
+                censored=data.get("censored", {}),
+            )
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Metrics index {index_path} could not be read: {e}")
+            return None
+
+
+def lookup_metric(state_path: str, cycle: int) -> Tuple[bool, Optional[float]]:
+    """
+    Looks up the metric of an already simulated cycle in the metrics index stored
+    next to the state file.
+    """
+    index = MetricsIndex.read(MetricsIndex.get_path(state_path))
+    if index is None:
+        return False, None
+    return index.get_metric(cycle)
+
+
+def _to_json_value(value):
+    return None if value is None else float(value)
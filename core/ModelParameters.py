@@ -15,6 +15,7 @@ import json
 class ModelParameters:
     non_degradation_parameters: NonDegradationParameters = field(init=False)
     degradation_parameters: Optional[DegradationParameters] = field(init=False)
+    solver: Optional[str] = field(init=False, default=None)
 
     def __init__(
         self,
@@ -60,6 +61,11 @@ class ModelParameters:
         else:
             self.degradation_parameters = command_degradation_parameter
 
+        # Solver from the command, otherwise from the param file
+        self.solver = kwargs.get("solver") or (
+            json.loads(json_str).get("solver") if json_str else None
+        )
+
     @staticmethod
     def _extract_parameters(param_class, kwargs):
         keys = param_class.__annotations__.keys()
@@ -129,6 +135,8 @@ class ModelParameters:
                 else None
             ),
         }
+        if self.solver is not None:
+            model_params_dict["solver"] = self.solver
         return json.dumps(model_params_dict, indent=4)
 
     @classmethod
@@ -1,10 +1,12 @@
 import logging
 import os
 import pickle
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Optional, Tuple
 
 import h5py
+import numpy as np
 import pybamm
 from core.ModelInfo import ArrayPybammMetrics, PybammInfo
 from core.utils import PybammOutput, get_base_path
@@ -15,15 +17,141 @@ def get_state_path(id_battery, id_configuration) -> str:
     return path
 
 
+@dataclass
+class LeanState:
+    """
+    Final state vector of a solution, all the next experiment needs to start from it.
+    A pybamm.Solution would also pickle every model it was solved with.
+
+    Attributes:
+        t (np.ndarray): Time of the state.
+        y (np.ndarray): State vector, as a single column.
+        termination (str): Termination reason of the step that reached the state.
+        variables (tuple): Name, start and stop of every state variable in y.
+    """
+
+    t: np.ndarray
+    y: np.ndarray
+    termination: Optional[str] = None
+    variables: Optional[Tuple[Tuple[str, int, int], ...]] = None
+
+    @classmethod
+    def from_solution(cls, solution: pybamm.Solution) -> "LeanState":
+        return cls(
+            t=np.array(solution.all_ts[-1][-1:]),
+            y=np.array(solution.all_ys[-1][:, -1:]),
+            termination=solution.termination,
+            variables=get_state_variables(solution.all_models[-1]),
+        )
+
+    def matches(self, model: pybamm.BaseModel) -> bool:
+        """
+        Whether model lays out its states as the state vector. States saved without
+        their variables are only compared by size.
+        """
+        if self.variables is None:
+            return model.len_rhs_and_alg == self.y.shape[0]
+        return get_state_variables(model) == self.variables
+
+    def holds(self, name: str) -> bool:
+        """
+        Whether the state vector holds the variable name. States saved without their
+        variables are taken not to.
+        """
+        return self.variables is not None and any(
+            variable == name for variable, _, _ in self.variables
+        )
+
+    def to_model(self, model: pybamm.BaseModel, inputs: dict) -> np.ndarray:
+        """
+        State vector laid out for model, whose states differ from the ones of the
+        state. The variables of the state are copied by name, and the ones only model
+        has start from their initial condition.
+        """
+        y = model.concatenated_initial_conditions.evaluate(0, inputs=inputs)
+        y = np.array(y, dtype=float).reshape(-1, 1)
+        slices = {name: slice(start, stop) for name, start, stop in self.variables}
+        for name, start, stop in get_state_variables(model):
+            if name in slices:
+                y[start:stop] = self.y[slices[name]]
+        return y
+
+    def to_solution(self, sim: pybamm.Simulation, inputs: dict) -> pybamm.Solution:
+        """
+        Rebuilds the starting solution of an experiment of the built simulation sim.
+        The state is attached to the model of the first step, so the solver starts
+        from the state vector as is. Any other model of sim with the same states is
+        used otherwise, and the state is mapped onto the first step by the names of
+        its variables when none has, such as a state of the main experiment, whose
+        model also solves the discharge capacity, before a capacity test.
+
+        Parameters:
+        - sim: The built simulation about to be solved.
+        - inputs: The input parameters of the solve, which the models of sim
+          process their variables with.
+
+        Raises:
+        - ValueError: If no model of sim has the states of the state vector and the
+          state does not name its variables.
+        """
+        first_step = sim.experiment.operating_conditions_steps[0].basic_repr()
+        models = sim.op_conds_to_built_models
+        inputs = {**inputs, "start time": float(self.t[-1])}
+        for model in [models[first_step]] + list(models.values()):
+            if self.matches(model):
+                return self.attach(model, self.y, inputs)
+        if self.variables is None:
+            raise ValueError(
+                f"No model of the simulation has {self.y.shape[0]} states to start from"
+            )
+        model = models[first_step]
+        y = self.to_model(model, get_model_inputs(model, inputs))
+        return self.attach(model, y, inputs)
+
+    def attach(
+        self, model: pybamm.BaseModel, y: np.ndarray, inputs: dict
+    ) -> pybamm.Solution:
+        solution = pybamm.Solution(
+            self.t,
+            y,
+            model,
+            get_model_inputs(model, inputs),
+            termination=self.termination,
+        )
+        solution.set_up_time = 0
+        solution.solve_time = 0
+        solution.integration_time = 0
+        return solution
+
+
+def get_model_inputs(model: pybamm.BaseModel, inputs: dict) -> dict:
+    # Ordered and filtered as the solvers do for the steps of the model
+    return {
+        name: inputs[name]
+        for name in sorted(parameter.name for parameter in model.input_parameters)
+    }
+
+
+def get_state_variables(model: pybamm.BaseModel) -> Tuple[Tuple[str, int, int], ...]:
+    return tuple(
+        (variable.name, y_slice.start, y_slice.stop)
+        for variable, y_slices in model.y_slices.items()
+        for y_slice in y_slices
+    )
+
+
 @dataclass
 class StateModel:
-    first_pybamm_output: PybammOutput
-    last_ModelState: pybamm.Solution
-    array_pybamm_metric: ArrayPybammMetrics = ArrayPybammMetrics()
+    # Output of the first cycle, None until it is simulated
+    first_pybamm_output: Optional[PybammOutput]
+    last_ModelState: LeanState
+    array_pybamm_metric: ArrayPybammMetrics = field(default_factory=ArrayPybammMetrics)
+    # Min and max discharge capacity of the last simulated capacity test
+    soc_normalisation: Optional[Tuple[float, float]] = None
 
     def add_solution(self, output, last_state, cycle, info: PybammInfo):
         self.array_pybamm_metric[cycle] = info
-        self.last_ModelState = last_state
+        self.last_ModelState = LeanState.from_solution(last_state)
         if cycle == 0:
             self.first_pybamm_output = output
 
@@ -0,0 +1,92 @@
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+THREADS_ENV = "BMO_THREADS_PER_EVALUATION"
+PIN_CORES_ENV = "BMO_PIN_CORES"
+SLOT_ENV = "BMO_PLACEMENT_SLOT"
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "BLIS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+# Threads granted to the evaluation running in this process, read by the solvers
+_threads = 1
+
+
+@dataclass
+class PlacementPolicy:
+    """
+    How the cores of a node are split between concurrent evaluations.
+
+    Every evaluation gets `threads` threads for BLAS, OpenMP (used by CasADi) and the
+    IDAKLU solver. With `pin_cores`, the evaluation running in slot i is bound to
+    the i-th group of `threads` cores, so concurrent workers never share a core.
+
+    Attributes:
+        threads (int): Threads per evaluation.
+        pin_cores (bool): Bind each evaluation to its own cores.
+        cores (List[int]): Cores of the node available to the evaluations.
+    """
+
+    threads: int = 1
+    pin_cores: bool = False
+    cores: List[int] = field(default_factory=lambda: sorted(os.sched_getaffinity(0)))
+
+    @classmethod
+    def from_environment(cls) -> "PlacementPolicy":
+        return cls(
+            threads=int(os.getenv(THREADS_ENV, 1)),
+            pin_cores=os.getenv(PIN_CORES_ENV, "0").lower() in ("1", "true", "yes"),
+        )
+
+    @property
+    def slots(self) -> int:
+        """Number of evaluations that fit on the cores without sharing them."""
+        return max(len(self.cores) // self.threads, 1)
+
+    def get_cores(self, slot: int) -> List[int]:
+        start = (slot % self.slots) * self.threads
+        return self.cores[start : start + self.threads] or self.cores
+
+
+def get_threads() -> int:
+    return _threads
+
+
+def apply_placement(policy: PlacementPolicy, slot: Optional[int] = None):
+    """
+    Applies the policy to the current process before an evaluation.
+
+    The environment variables are honoured by libraries loaded afterwards, while
+    threadpoolctl, when installed, limits the BLAS and OpenMP pools already loaded.
+
+    Parameters:
+    - policy: The placement policy of the node.
+    - slot: Index of the evaluation among the concurrent ones, used to pick its
+      cores. Defaults to BMO_PLACEMENT_SLOT; no pinning happens without a slot.
+    """
+    global _threads
+    _threads = policy.threads
+    for env_var in THREAD_ENV_VARS:
+        os.environ[env_var] = str(policy.threads)
+    try:
+        from threadpoolctl import threadpool_limits
+
+        threadpool_limits(limits=policy.threads)
+    except ImportError:
+        pass
+
+    if slot is None and os.getenv(SLOT_ENV) is not None:
+        slot = int(os.getenv(SLOT_ENV))
+    if policy.pin_cores and slot is not None:
+        cores = policy.get_cores(slot)
+        os.sched_setaffinity(0, cores)
+        logging.info(f"Placement slot {slot}: {policy.threads} threads on cores {cores}")
+    else:
+        logging.info(f"Placement: {policy.threads} threads per evaluation")
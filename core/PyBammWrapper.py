@@ -1,19 +1,216 @@
+import copy
+import hashlib
 import logging
+import multiprocessing
 import os
-from dataclasses import InitVar, dataclass, field
+from collections import OrderedDict
+from dataclasses import InitVar, dataclass, field, fields
 from enum import Enum
-from typing import Optional
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pybamm
+from scipy.integrate import cumulative_trapezoid
+from core.CapacitySchedule import CapacitySchedule
+from core.DriveCycle import DriveCycle
 from core.DatasetBase import AbstractBaseDataset, DatasetID, Experiments
+from core.Fidelity import FIDELITY_HIGH, FIDELITY_LEVELS
+from core.MetricsIndex import MetricsIndex
 from core.ModelInfo import ModelMetrics, ModelStatus, PybammInfo
 from core.ModelParameters import ModelParameters
-from core.ModelState import StateModel
+from core.ModelState import LeanState, StateModel
+from core.SimulationCache import SIMULATION_CODE_VERSION, SimulationCache, canonical_hash
+from core.Solvers import DEFAULT_SOLVER, create_solver
+from core.Telemetry import stage
 from core.utils import PybammOutput
 from databases.DatasetEV import DatasetEV
 
 # os.environ["OPENBLAS_NUM_THREADS"] = "1"
 
+PARAMETER_SET = "OKane2022"
+BASE_MODEL_OPTIONS = {"calculate discharge energy": "true"}
+DEGRADATION_MODEL_OPTIONS = {
+    "SEI": "solvent-diffusion limited",
+    "SEI porosity change": "true",
+    "lithium plating": "partially reversible",
+    "lithium plating porosity change": "true",
+    "particle mechanics": ("swelling and cracking", "swelling only"),
+    "SEI on cracks": "true",
+    "loss of active material": "stress-driven",
+}
+# Parameters PyBaMM needs as numbers when building a simulation: they define the
+# mesh, the initial stoichiometries or the current of the C-rate steps. Every other
+# optimized parameter is declared as an input parameter
+STRUCTURAL_PARAMETERS = frozenset(
+    {
+        "Negative electrode thickness [m]",
+        "Separator thickness [m]",
+        "Positive electrode thickness [m]",
+        "Electrode height [m]",
+        "Electrode width [m]",
+        "Negative particle radius [m]",
+        "Positive particle radius [m]",
+        "Nominal cell capacity [A.h]",
+        "Maximum concentration in negative electrode [mol.m-3]",
+        "Maximum concentration in positive electrode [mol.m-3]",
+        "Negative electrode active material volume fraction",
+        "Positive electrode active material volume fraction",
+        "Initial concentration in negative electrode [mol.m-3]",
+        "Initial concentration in positive electrode [mol.m-3]",
+        "Open-circuit voltage at 0% SOC [V]",
+        "Open-circuit voltage at 100% SOC [V]",
+        "Negative electrode OCP entropic change [V.K-1]",
+        "Positive electrode OCP entropic change [V.K-1]",
+    }
+)
+MAX_CACHED_SIMULATIONS = 8
+# Models selectable by the fidelity levels, the SPMe being used to pre-screen
+MODELS = {"DFN": pybamm.lithium_ion.DFN, "SPMe": pybamm.lithium_ion.SPMe}
+SOC_MIN_DISCHARGE = "SoC min discharge [A.h]"
+SOC_MAX_DISCHARGE = "SoC max discharge [A.h]"
+DISCHARGE_CAPACITY = "Discharge capacity [A.h]"
+# Seed PyBaMM gives the global random generator when a simulation is created. The
+# casadi solver perturbs its initial algebraic guess with it, so it is seeded again
+# before every solve, as when each experiment had a simulation of its own
+SOLVE_SEED = int(hashlib.sha256(b"Simulation").hexdigest(), 16) % (2**32)
+
+# Simulations built in this process, reused by every experiment and cycle with the
+# same structure as only the input parameters change between them
+_simulations: "OrderedDict[str, pybamm.Simulation]" = OrderedDict()
+
+
+@lru_cache(maxsize=None)
+def _load_parameter_set(name: str) -> pybamm.ParameterValues:
+    logging.info(f"Loading parameter set {name}")
+    return pybamm.ParameterValues(name)
+
+
+def load_parameter_values(name: str = PARAMETER_SET) -> pybamm.ParameterValues:
+    """
+    Returns a fresh copy of a PyBaMM parameter set. The set itself is only loaded
+    once per process, so long-lived workers pay the loading cost a single time.
+    """
+    return _load_parameter_set(name).copy()
+
+
+def get_model_options(degradation: bool) -> dict:
+    if not degradation:
+        return dict(BASE_MODEL_OPTIONS)
+    return {**BASE_MODEL_OPTIONS, **DEGRADATION_MODEL_OPTIONS}
+
+
+@lru_cache(maxsize=None)
+def _build_model(degradation: bool, model_name: str) -> pybamm.BaseModel:
+    logging.info(f"Building {model_name} model (degradation: {degradation})")
+    return MODELS[model_name](get_model_options(degradation))
+
+
+def build_model(degradation: bool, model_name: str = "DFN") -> pybamm.BaseModel:
+    """
+    Returns a copy of the model for the given mode. The model is built once per
+    process and copied afterwards, as each wrapper adds its own custom variables.
+    """
+    return _build_model(degradation, model_name).new_copy()
+
+
+def warm_up():
+    """
+    Loads the parameter set and builds every model variant so that processes forked
+    afterwards inherit them instead of rebuilding them for each evaluation.
+    """
+    load_parameter_values()
+    for degradation in (False, True):
+        build_model(degradation)
+
+
+def split_parameters(model_parameters: ModelParameters) -> Tuple[dict, dict]:
+    """
+    Splits the optimized parameters into those declared as PyBaMM input parameters
+    and the structural ones. Parameters left as None keep the value of the parameter
+    set and are in neither.
+
+    Returns:
+    - Tuple[dict, dict]: The input and the structural parameters by name.
+    """
+    parameters = {
+        name: value
+        for group in model_parameters.to_dict().values()
+        for name, value in group.items()
+        if value is not None
+    }
+    inputs = {
+        name: value
+        for name, value in parameters.items()
+        if name not in STRUCTURAL_PARAMETERS
+    }
+    structural_parameters = {
+        name: value for name, value in parameters.items() if name in STRUCTURAL_PARAMETERS
+    }
+    return inputs, structural_parameters
+
+
+def get_parameters_structure(model_parameters: ModelParameters) -> str:
+    """
+    Hashes what parameter sets must share to be solved with the same simulations.
+    """
+    inputs, structural_parameters = split_parameters(model_parameters)
+    return canonical_hash(
+        {
+            "degradation": model_parameters.degradation_parameters is not None,
+            "structural_parameters": structural_parameters,
+            "inputs": sorted(inputs),
+            "solver": model_parameters.solver,
+        }
+    )
+
+
+def get_experiment_signature(experiment: pybamm.Experiment) -> str:
+    """
+    Hashes the steps of an experiment, including drive-cycle profiles, so equal
+    experiments created by different wrappers share their built simulations.
+    """
+    steps = []
+    for step in experiment.operating_conditions_steps:
+        value = step.value
+        if isinstance(value, np.ndarray):
+            value = hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()
+        elif isinstance(value, pybamm.Interpolant):
+            # Drive cycles are stored as interpolants, whose repr omits the data
+            data = np.concatenate([np.ravel(x) for x in value.x] + [np.ravel(value.y)])
+            value = [
+                [str(child) for child in value.children],
+                hashlib.sha256(np.ascontiguousarray(data).tobytes()).hexdigest(),
+            ]
+        steps.append(
+            {
+                "type": step.type,
+                "value": value,
+                "duration": step.duration,
+                "period": step.period,
+                "temperature": step.temperature,
+                "termination": [
+                    [type(t).__name__, getattr(t, "value", None), getattr(t, "name", None)]
+                    for t in step.termination
+                ],
+            }
+        )
+    return canonical_hash({"steps": steps})
+
+
+def integrate_discharge_capacity(output: PybammOutput) -> PybammOutput:
+    """
+    Output of a main experiment started from a state without the discharge capacity
+    counter, such as the init state, with the counter replaced by its time integral.
+    PyBaMM used to post-process the counter of such a solution as an explicit time
+    integral, and the metrics of the first cycle have always read it that way.
+    """
+    df = output.df.copy()
+    df["Dis"] = cumulative_trapezoid(
+        df["Dis"].to_numpy(), 3600 * df["relative_time"].to_numpy(), initial=0
+    )
+    return PybammOutput.from_dataframe(df)
+
 
 class SimFailedException(Exception):
     pass
@@ -50,19 +247,39 @@ class PyBammWrapper:
         degradation (bool): Indicates if degradation effects are considered in the model.
         var_pts (Optional[dict]): Variable points for the simulation discretization.
         solver (Optional[pybamm.BaseSolver]): Solver to be used for the simulation.
+        solver_name (Optional[str]): Registered solver to use, see core.Solvers.
+        fidelity (str): Fidelity level of the mesh and tolerances, see core.Fidelity.
+        capacity_schedule (CapacitySchedule): Cycles on which the capacity test runs.
+        cycles_per_solve (int): Main cycles solved in a single experiment.
+        keep_outputs (bool): Keeps the output of every simulated cycle in outputs.
+        outputs (dict): Outputs of the simulated cycles by cycle, with keep_outputs.
         success (bool): Flag indicating if the simulation ran successfully.
         n_cycles_per_experiments (int): Number of cycles per experiment.
         dataset_path (Optional[str]): Path to the dataset.
-        state_path (Optional[str]): Path to the model state.
+        drive_cycle_path (Optional[str]): Path of the drive cycle current profile.
+        drive_cycle (DriveCycle): Representation of the drive cycle step.
+        columnar_path (Optional[str]): Columnar copy of the dataset, read instead.
+        state_path (Optional[str]): Path to the model state, None to keep it in memory.
         result_path (Optional[str]): Path for saving simulation results.
         instance_id (Optional[str]): Instance identifier.
         dataset_id (Optional[DatasetID]): Enum specifying the dataset ID.
         id_battery (Optional[str]): Identifier for the battery model.
+        cache_path (Optional[str]): Path of the content-addressed state cache, if any.
+        simulation_key (Optional[str]): Hash identifying the simulation in the cache.
+        init_key (Optional[str]): Hash identifying the initialization in the cache.
+        inputs (dict): Values of the parameters declared as PyBaMM input parameters.
+        structural_parameters (dict): Optimized parameters kept as numbers in param.
+        custom_variables (dict): Signatures of the custom variables added to the model.
+        main_model (pybamm.BaseModel): Copy of the model with the SoC, only used by
+            the main experiments.
+        experiment_signatures (dict): Hash of the steps of every experiment by name.
+        main_experiment_args (tuple): Pristine copy of the main experiment arguments.
+        main_experiments (dict): Main experiments repeated several times, by cycles.
     """
 
     # Paths and identifiers
     dataset_path: str
-    state_path: str
+    state_path: Optional[str]
     result_path: str
     instance_id: str
     id_dataset: DatasetID
@@ -73,6 +290,7 @@ class PyBammWrapper:
     model_parameters: InitVar[ModelParameters]
     param: pybamm.ParameterValues = field(init=False)
     model: pybamm.BaseModel = field(init=False)
+    main_model: pybamm.BaseModel = field(init=False)
     dataset: AbstractBaseDataset = field(init=False)
     experiments: Experiments = field(init=False)
     state: StateModel = field(init=False)
@@ -81,7 +299,28 @@ class PyBammWrapper:
     degradation: bool = field(init=False)
     var_pts: Optional[dict] = None
     solver: Optional[pybamm.BaseSolver] = None
+    solver_name: Optional[str] = None
+    fidelity: str = FIDELITY_HIGH
+    capacity_schedule: CapacitySchedule = field(default_factory=CapacitySchedule)
+    cycles_per_solve: int = 1
+    keep_outputs: bool = False
+    outputs: Dict[int, PybammOutput] = field(init=False, default_factory=dict)
     success: bool = True
+    cache_path: Optional[str] = None
+    drive_cycle_path: Optional[str] = None
+    drive_cycle: DriveCycle = field(default_factory=DriveCycle)
+    columnar_path: Optional[str] = None
+    simulation_key: Optional[str] = field(init=False, default=None)
+    cache: Optional[SimulationCache] = field(init=False, default=None)
+    init_key: Optional[str] = field(init=False, default=None)
+    init_cache: Optional[SimulationCache] = field(init=False, default=None)
+    simulation_cache: Optional[SimulationCache] = field(init=False, default=None)
+    inputs: dict = field(init=False, default_factory=dict)
+    structural_parameters: dict = field(init=False, default_factory=dict)
+    custom_variables: dict = field(init=False, default_factory=dict)
+    experiment_signatures: dict = field(init=False, default_factory=dict)
+    main_experiment_args: tuple = field(init=False, default=())
+    main_experiments: dict = field(init=False, default_factory=dict)
     state
 
     def __post_init__(self, model_parameters):
@@ -90,15 +329,28 @@ class PyBammWrapper:
         and custom variables after the dataclass has been initialized.
         """
 
-        self.initialize_dataset()
-        self.experiments = self.dataset.setup_experiment()
-        self.initialize_param_and_model(model_parameters)
+        with stage("dataset"):
+            self.initialize_dataset()
+            self.experiments = self.dataset.setup_experiment()
+            # Taken before any simulation is built, as building one mutates its steps
+            self.experiment_signatures = {
+                experiment_field.name: get_experiment_signature(
+                    getattr(self.experiments, experiment_field.name)
+                )
+                for experiment_field in fields(self.experiments)
+            }
+            self.main_experiment_args = copy.deepcopy(self.experiments.main.args)
+        with stage("model_build"):
+            self.initialize_param_and_model(model_parameters)
         self.model_callback = self.ExperimentCallback(self)
         self.configure_solver_and_varpts()
         self.add_custom_variables()
+        self.initialize_cache(model_parameters)
 
     def initialize_state(self):
-        state = self.read_state()
+        with stage("state_load"):
+            state = self.read_state()
+        state = self.read_cached_state(state, min_cycles=1)
         if state is None:
             logging.info("Running initialization experiment.")
             initial_state = self.initialize_experiment()
@@ -128,21 +380,27 @@ class PyBammWrapper:
         return discharge_vector.max() - discharge_vector.min()
 
     def update_discharge_capacity(self, output_capacity):
+        """
+        Updates the SoC normalisation with the discharge capacity measured by the
+        capacity test. The bounds are input parameters of the SoC variable, so the
+        model and the simulations built from it stay untouched.
+        """
         df_capacity_test = PybammOutput(output_capacity).df
         discharge_vector = df_capacity_test[df_capacity_test["Step"] == 4][
             "Dis"
         ].to_numpy()
-        min_discharge = discharge_vector[0]
-        max_discharge = discharge_vector[-1]
+        self.min_discharge = float(discharge_vector[0])
+        self.max_discharge = float(discharge_vector[-1])
 
-        logging.info(f"min discharge { min_discharge}- max_discharge {max_discharge}")
-        self.__add_variables(
-            "SoC",
-            (self.model.variables["Discharge capacity [A.h]"] - min_discharge)
-            / (max_discharge - min_discharge),
+        logging.info(
+            f"min discharge { self.min_discharge}- max_discharge {self.max_discharge}"
         )
-        #     # - self.min_discharge / (self.max_discharge - self.min_discharge),
-        # )
+
+    def get_soc_inputs(self) -> dict:
+        return {
+            SOC_MIN_DISCHARGE: self.min_discharge,
+            SOC_MAX_DISCHARGE: self.max_discharge,
+        }
 
     def update_state(self):
         state = self.read_state()
@@ -165,6 +423,10 @@ class PyBammWrapper:
                 results_path=self.result_path,
                 instance_id=self.instance_id,
                 battery_id=DatasetEV.get_battery_by_name(self.id_battery),
+                drive_cycle_path=self.drive_cycle_path,
+                drive_cycle=self.drive_cycle,
+                cache_path=self.cache_path,
+                columnar_path=self.columnar_path,
             )
         else:
             logging.error(f"Not Valid dataset id {self.id_dataset.value}")
@@ -174,63 +436,154 @@ class PyBammWrapper:
         """
         Initializes the simulation parameters and selects the appropriate model based on the presence of degradation.
         """
-        # Placeholder for parameter values - consider making this configurable
-        param = pybamm.ParameterValues("OKane2022")
+        param = load_parameter_values()
         self.degradation = model_parameters.degradation_parameters is not None
         logging.info(f"Mode degradation: {self.degradation}")
         self.param = model_parameters.update_param(param)
+        self.declare_input_parameters(model_parameters)
         self.model = self.select_model_based_on_degradation()
 
+    def declare_input_parameters(self, model_parameters: ModelParameters):
+        """
+        Declares the optimized parameters as PyBaMM input parameters, except the
+        structural ones, so a simulation built for one configuration solves any other
+        configuration with the same structure by only changing its inputs.
+        """
+        self.inputs, self.structural_parameters = split_parameters(model_parameters)
+        self.param.update({name: "[input]" for name in self.inputs})
+
+    def use_numeric_parameters(self):
+        """
+        Restores the input parameters as numbers in param, for models that cannot
+        be built with them as inputs.
+        """
+        self.param.update(self.inputs)
+        self.structural_parameters.update(self.inputs)
+        self.inputs = {}
+
     def select_model_based_on_degradation(self):
         """
         Selects the simulation model. Returns a non-degradation model by default and a degradation model if applicable.
+        The model itself (DFN or SPMe) depends on the fidelity level.
         """
-        base_config = {"calculate discharge energy": "true"}
-        if not self.degradation:
-            return pybamm.lithium_ion.DFN(base_config)
-        else:
-            degradation_config = {
-                "SEI": "solvent-diffusion limited",
-                "SEI porosity change": "true",
-                "lithium plating": "partially reversible",
-                "lithium plating porosity change": "true",
-                "particle mechanics": ("swelling and cracking", "swelling only"),
-                "SEI on cracks": "true",
-                "loss of active material": "stress-driven",
-            }
-            return pybamm.lithium_ion.DFN({**base_config, **degradation_config})
+        return build_model(self.degradation, FIDELITY_LEVELS[self.fidelity].model)
 
     def configure_solver_and_varpts(self):
         """
         Configures the solver with predefined accuracy and variable points for the simulation discretization.
+        The solver is picked by name from the registry in core.Solvers, and the mesh and
+        tolerances depend on the fidelity level.
         """
+        level = FIDELITY_LEVELS[self.fidelity]
         if self.degradation:
-            tolerance = 1e-6
+            tolerance = level.degradation_tolerance
         else:
-            tolerance = 1e-4
+            tolerance = level.tolerance
         atol, rtol = tolerance, tolerance  # Absolute and relative tolerances
-        self.solver = pybamm.CasadiSolver(atol=atol, rtol=rtol, mode="safe")
-        # options = {
-        #     # Number of threads available for OpenMP
-        #     "num_threads": 10,
-        # }
-        # self.solver = pybamm.IDAKLUSolver(atol=atol, rtol=rtol, options=options)
+        self.solver = create_solver(self.solver_name or DEFAULT_SOLVER, atol, rtol)
+        logging.info(f"Solver: {self.solver_name or DEFAULT_SOLVER}")
         # Discretization points
-        self.var_pts = {
-            "x_n": 5,  # negative electrode
-            "x_s": 5,  # separator
-            "x_p": 5,  # positive electrode
-            "r_n": 30,  # negative particle
-            "r_p": 30,  # positive particle
-        }
+        self.var_pts = dict(level.var_pts)
 
     def read_state(self):
         """
-        Reads the initial state of the model, if available.
+        Reads the initial state of the model, if available. Wrappers without a state
+        path keep their state in memory only.
         """
-        # Assumes implementation of read_state elsewhere
+        if self.state_path is None:
+            return None
         return StateModel.read_state(self.state_path)
 
+    def initialize_cache(self, model_parameters: ModelParameters):
+        """
+        Opens the content-addressed state caches, if a cache path was given, and
+        computes the keys of this simulation and of its initialization.
+        """
+        if not self.cache_path:
+            return
+        self.cache = SimulationCache(self.cache_path)
+        # The schedule changes the SoC normalisation of the cycles and solving them
+        # together their numerical error, but neither changes the init
+        self.simulation_key = self.get_simulation_key(
+            {
+                **model_parameters.to_dict(),
+                "capacity_schedule": self.capacity_schedule.to_dict(),
+                "cycles_per_solve": self.cycles_per_solve,
+            }
+        )
+        self.init_cache = SimulationCache(self.cache_path, namespace="init")
+        self.simulation_cache = SimulationCache(self.cache_path, namespace="simulations")
+        # The init experiment is a rest and a single discharge, so the degradation
+        # parameters are left out and degradation configurations share their init
+        init_parameters = model_parameters.non_degradation_parameters.to_dict()
+        self.init_key = self.get_simulation_key(
+            {"non_degradation_parameters": init_parameters}
+        )
+        logging.info(f"Simulation key: {self.simulation_key} init key: {self.init_key}")
+
+    def get_simulation_key(self, parameters: dict) -> str:
+        """
+        Hashes everything that determines the simulated cycles and their metrics, so
+        configurations with identical parameters share the same key whatever their id.
+        """
+        return canonical_hash(
+            {
+                "parameters": parameters,
+                "battery": self.id_battery,
+                "dataset": self.id_dataset.name,
+                "dataset_file": os.path.basename(self.dataset_path),
+                "experiments": self.experiment_signatures,
+                "model": FIDELITY_LEVELS[self.fidelity].model,
+                "model_options": get_model_options(self.degradation),
+                "var_pts": self.var_pts,
+                "solver": {
+                    "name": type(self.solver).__name__,
+                    "atol": self.solver.atol,
+                    "rtol": self.solver.rtol,
+                    "mode": getattr(self.solver, "mode", None),
+                },
+                "code_version": SIMULATION_CODE_VERSION,
+                "pybamm_version": pybamm.__version__,
+            }
+        )
+
+    def read_cached_state(
+        self, state: Optional[StateModel], min_cycles: int
+    ) -> Optional[StateModel]:
+        """
+        Replaces state by the cached one when the cache holds at least min_cycles
+        cycles and more than state. The adopted state is saved as this configuration's
+        own state, so later evaluations find it without the cache.
+        """
+        if self.cache is None:
+            return state
+        current_cycles = 0 if state is None else len(state)
+        cached_state = self.cache.read_state(
+            self.simulation_key, max(min_cycles, current_cycles + 1)
+        )
+        if cached_state is None:
+            return state
+        logging.info(
+            f"Using cached state with {len(cached_state)} cycles instead of {current_cycles}"
+        )
+        if self.state_path is not None:
+            cached_state.save_state(state_path=self.state_path)
+            MetricsIndex.from_state(cached_state, self.degradation).save(
+                MetricsIndex.get_path(self.state_path)
+            )
+        return cached_state
+
+    def publish_state(self):
+        """
+        Publishes the state to the cache, unless the cache already holds as much.
+        """
+        if self.cache is None:
+            return
+        try:
+            self.cache.save_state(self.simulation_key, self.state, self.degradation)
+        except OSError as e:
+            logging.warning(f"State could not be cached: {e}")
+
     def add_custom_variables(self):
         """
         Adds custom variables to the model, such as State of Charge (SoC).
@@ -238,25 +591,37 @@ class PyBammWrapper:
         self.min_discharge = 0
         self.max_discharge = self.param["Nominal cell capacity [A.h]"]
         self.__add_variables(
+            self.model,
             "Current_capacity [A.h]",
             self.param["Nominal cell capacity [A.h]"],
+            signature=self.param["Nominal cell capacity [A.h]"],
+        )
+        # Only the main experiments terminate on the SoC. Without a variable referring
+        # to it, PyBaMM integrates the discharge capacity of the init and capacity
+        # experiments over their solution points instead of solving it as a state,
+        # which their metrics and the SoC normalisation have always been computed with
+        self.main_model = self.model.new_copy()
+        # Normalised with the capacity test of each cycle, passed as inputs on solve
+        min_discharge = pybamm.InputParameter(SOC_MIN_DISCHARGE)
+        max_discharge = pybamm.InputParameter(SOC_MAX_DISCHARGE)
+        self.__add_variables(
+            self.main_model,
+            "SoC",
+            (self.main_model.variables[DISCHARGE_CAPACITY] - min_discharge)
+            / (max_discharge - min_discharge),
+            signature=[SOC_MIN_DISCHARGE, SOC_MAX_DISCHARGE],
         )
-        # self.model.variables["min_discharge"] = pybamm.surf(
-        #     pybamm.Variable("min_discharge")
-        # )
-        # self.__add_variables(
-        #     "SoC",
-        #     self.model.variables["Discharge capacity [A.h]"]
-        #     - self.model.variables["min_discharge"]
-        #     / (self.max_discharge - self.min_discharge),
-        #     # - self.min_discharge / (self.max_discharge - self.min_discharge),
-        # )
 
     def __len_metrics__(self):
         return len(self.state.array_pybamm_metric)
 
-    def __add_variables(self, name_variable, variable):
-        self.model.variables[name_variable] = variable
+    def __add_variables(self, model, name_variable, variable, signature):
+        """
+        Adds a variable to model. The signature identifies its expression in the
+        key of the built simulations, which must be rebuilt when it changes.
+        """
+        model.variables[name_variable] = variable
+        self.custom_variables[name_variable] = signature
 
     class ExperimentCallback(pybamm.callbacks.Callback):
         def __init__(self, wrap_instance):
@@ -276,28 +641,155 @@ class PyBammWrapper:
         Utilizes the model, parameters, and solver already configured in the class to execute the simulation.
         Allows continuation from a previous state and setting an initial state of charge (SoC).
 
+        Some configurations cannot be built or solved with their optimized parameters
+        as inputs. When the build or the solve fails with inputs, the experiment is
+        solved again with them as numbers, which later experiments keep using.
+
         Parameters:
-        - last_state: Previous simulation's final state, or None to start fresh.
+        - last_state: Previous simulation's final state, as a LeanState or a
+          pybamm.Solution, or None to start fresh.
         - experiment: PyBaMM experiment object defining the simulation protocol.
         - initial_soc: Starting state of charge as a fraction (e.g., 0.8 for 80%).
 
         Returns:
         The simulation result as a pybamm.Solution object.
         """
-        sim = pybamm.Simulation(
-            self.model,
-            parameter_values=self.param,
-            experiment=experiment,
-            var_pts=self.var_pts,
-            solver=self.solver,
+        success = self.success
+        try:
+            solution = self.solve_experiment(last_state, experiment, initial_soc)
+        except Exception as e:
+            if not self.inputs:
+                raise
+            reason = e
+        else:
+            if self.success or not self.inputs:
+                return solution
+            reason = "unsuccessful solution"
+        logging.warning(
+            f"Experiment {self.get_experiment_name(experiment)} failed with input "
+            f"parameters ({reason}), retrying with numeric parameters"
         )
-        new_solution = sim.solve(
-            callbacks=self.model_callback,
-            starting_solution=last_state,
-            initial_soc=initial_soc,
-            calc_esoh=False
+        self.use_numeric_parameters()
+        self.success = success
+        return self.solve_experiment(last_state, experiment, initial_soc)
+
+    def solve_experiment(self, last_state, experiment, initial_soc):
+        """
+        Solves the experiment with the current parameters, see run_experiment.
+        The simulation is solved on a shallow copy, so the cached one shares its
+        built models and solver but never holds on to the solution.
+        """
+        experiment_name = self.get_experiment_name(experiment)
+        sim = copy.copy(self.get_simulation(experiment, initial_soc))
+        inputs = {**self.inputs, **self.get_soc_inputs()}
+        if isinstance(last_state, LeanState):
+            last_state = last_state.to_solution(sim, inputs)
+        np.random.seed(SOLVE_SEED)
+        with stage("solve", experiment=experiment_name):
+            return sim.solve(
+                callbacks=self.model_callback,
+                starting_solution=last_state,
+                calc_esoh=False,
+                inputs=inputs,
+            )
+
+    def warm_up(self, cycles: int):
+        """
+        Builds and discretises the simulations of the init, capacity and main
+        experiments and reads the experimental data of cycles 0 to cycles, so
+        processes forked afterwards inherit them. A simulation that cannot be built
+        is left to the evaluations.
+        """
+        for experiment, initial_soc in (
+            (self.experiments.init, 1),
+            (self.experiments.capacity, 1),
+            (self.experiments.main, None),
+        ):
+            try:
+                self.get_simulation(experiment, initial_soc)
+            except Exception as e:
+                logging.warning(
+                    f"Simulation of {self.get_experiment_name(experiment)} not "
+                    f"warmed up: {e}"
+                )
+        self.dataset.warm_up(cycles)
+
+    def get_simulation(self, experiment, initial_soc) -> pybamm.Simulation:
+        """
+        Returns the simulation of the experiment, built and discretised once per
+        process for every structure and reused afterwards with new input values.
+        With a cache path, built simulations are also stored on disk, so new
+        processes load them instead of processing and discretising the model again.
+        """
+        key = self.get_simulation_structure_key(experiment, initial_soc)
+        sim = _simulations.get(key)
+        if sim is not None:
+            _simulations.move_to_end(key)
+            return sim
+        experiment_name = self.get_experiment_name(experiment)
+        if self.simulation_cache is not None:
+            with stage("simulation_load", experiment=experiment_name):
+                sim = self.simulation_cache.read_simulation(key)
+        if sim is None:
+            with stage("discretisation", experiment=experiment_name):
+                sim = pybamm.Simulation(
+                    self.get_model(experiment),
+                    parameter_values=self.param,
+                    experiment=experiment,
+                    var_pts=self.var_pts,
+                    solver=self.solver,
+                )
+                sim.build_for_experiment(initial_soc=initial_soc)
+            if self.simulation_cache is not None:
+                self.simulation_cache.save_simulation(key, sim)
+        _simulations[key] = sim
+        if len(_simulations) > MAX_CACHED_SIMULATIONS:
+            _simulations.popitem(last=False)
+        return sim
+
+    def get_model(self, experiment) -> pybamm.BaseModel:
+        """
+        Model the experiment is built with, the one with the SoC for the main ones.
+        """
+        if self.get_experiment_name(experiment).startswith("main"):
+            return self.main_model
+        return self.model
+
+    def get_simulation_structure_key(self, experiment, initial_soc) -> str:
+        """
+        Hashes everything a built simulation depends on apart from the inputs.
+        """
+        return canonical_hash(
+            {
+                "experiment": self.experiment_signatures[
+                    self.get_experiment_name(experiment)
+                ],
+                "initial_soc": initial_soc,
+                "structural_parameters": self.structural_parameters,
+                "inputs": sorted(self.inputs),
+                "model": FIDELITY_LEVELS[self.fidelity].model,
+                "model_options": get_model_options(self.degradation),
+                "custom_variables": self.custom_variables,
+                "var_pts": self.var_pts,
+                "solver": {
+                    "name": type(self.solver).__name__,
+                    "atol": self.solver.atol,
+                    "rtol": self.solver.rtol,
+                    "mode": getattr(self.solver, "mode", None),
+                },
+                "code_version": SIMULATION_CODE_VERSION,
+                "pybamm_version": pybamm.__version__,
+            }
         )
-        return new_solution
+
+    def get_experiment_name(self, experiment) -> Optional[str]:
+        for experiment_field in fields(self.experiments):
+            if getattr(self.experiments, experiment_field.name) is experiment:
+                return experiment_field.name
+        for n_cycles, main_experiment in self.main_experiments.items():
+            if main_experiment is experiment:
+                return f"main_x{n_cycles}"
+        return None
 
     def run_test_capacity(self):
         return self.run_experiment(
@@ -306,7 +798,7 @@ class PyBammWrapper:
             initial_soc=1,
         )
 
-    def run_pybamm(self, cycle):
+    def run_pybamm(self, cycle, last_cycle=None):
         """
         Runs a PyBaMM simulation for a specific cycle, handling initial setup if necessary.
 
@@ -315,8 +807,13 @@ class PyBammWrapper:
         to run the main experiment for the specified cycle. This method also handles
         logging and error checking throughout the process.
 
+        With cycles_per_solve > 1, the following cycles up to last_cycle are solved in
+        the same call, so the next requests find them already simulated, see
+        get_cycles_per_solve.
+
         Parameters:
         - cycle (int): The target simulation cycle number.
+        - last_cycle (Optional[int]): Last cycle of the run, defaults to cycle.
 
         Returns:
         - The relevant metric output for the specified cycle, or None if an error occurs
@@ -335,24 +832,123 @@ class PyBammWrapper:
                 f"Invalid cycle requested: {cycle}. Last cycle: {len(self.state) - 1}."
             )
             return None
+        # Another configuration with the same key may have simulated it already
+        self.state = self.read_cached_state(self.state, min_cycles=cycle + 1)
+        if cycle < len(self.state):
+            return self.extract_metric(cycle)
         # Run main experiment for the current cycle
         # if not self.update_discharge_capacity():
         #     return None
 
-        if not self.run_main_experiment(cycle):
+        last_cycle = cycle if last_cycle is None else max(cycle, last_cycle)
+        n_cycles = self.get_cycles_per_solve(cycle, last_cycle)
+        if not self.run_main_experiment(cycle, n_cycles):
             return None  # Errors logged in run_main_experiment()
 
         logging.info(f"Finishing Simulation with metrics len {len(self.state)}")
         # Extract and return the appropriate metric
         return self.extract_metric(cycle)
 
+    def evaluate_population(
+        self,
+        population: List[ModelParameters],
+        battery: Optional[str] = None,
+        cycles: int = 1,
+    ) -> List[float]:
+        """
+        Evaluates a population of parameter sets proposed by the optimizer over the
+        first cycles of battery, this wrapper's battery by default, in this process.
+
+        The members are evaluated grouped by structure: every member after the first
+        of a group solves the simulations built and discretised for it, only changing
+        the input parameters. Their states stay in memory, and are published to the
+        cache when a cache path is set. Unlike the evaluations of SimulationRunner,
+        no timeout applies.
+
+        Parameters:
+        - population: The parameter sets to evaluate.
+        - battery: Battery to evaluate them on.
+        - cycles: Number of cycles simulated for each parameter set.
+
+        Returns:
+        - List[float]: The cost of every member in the order of population, the mean
+          metric of its cycles, or inf if one of them failed.
+        """
+        costs = [float("inf")] * len(population)
+        order = sorted(
+            range(len(population)),
+            key=lambda index: get_parameters_structure(population[index]),
+        )
+        for index in order:
+            logging.info(f"Evaluating population member {index}")
+            try:
+                member = self.get_population_member(
+                    population[index], battery or self.id_battery, index
+                )
+                costs[index] = member.evaluate_cycles(cycles)
+            except Exception as e:
+                logging.error(f"Population member {index} failed: {e}")
+        return costs
+
+    def get_population_member(
+        self, model_parameters: ModelParameters, battery: str, index: int
+    ) -> "PyBammWrapper":
+        """
+        Returns a wrapper for one member of a population, with the settings of this
+        one and no state file.
+        """
+        return PyBammWrapper(
+            dataset_path=self.dataset_path,
+            state_path=None,
+            result_path=self.result_path,
+            instance_id=self.instance_id,
+            id_dataset=self.id_dataset,
+            id_battery=battery,
+            model_parameters=model_parameters,
+            id_configuration=f"{self.id_configuration}_member{index}",
+            seed=self.seed,
+            solver_name=model_parameters.solver or self.solver_name,
+            fidelity=self.fidelity,
+            capacity_schedule=self.capacity_schedule,
+            cycles_per_solve=self.cycles_per_solve,
+            keep_outputs=self.keep_outputs,
+            cache_path=self.cache_path,
+            drive_cycle_path=self.drive_cycle_path,
+            drive_cycle=self.drive_cycle,
+            columnar_path=self.columnar_path,
+        )
+
+    def evaluate_cycles(self, cycles: int) -> float:
+        """
+        Simulates the first cycles from the initialization in this process.
+
+        Returns:
+        - float: The mean metric of the cycles, or inf if one of them failed.
+        """
+        self.state = self.initialize_state()
+        metrics = []
+        for cycle in range(cycles):
+            metric = self.run_pybamm(cycle, last_cycle=cycles - 1)
+            if metric is None:
+                return float("inf")
+            metrics.append(metric)
+        return sum(metrics) / len(metrics)
+
     def initialize_experiment(self) -> Optional[StateModel]:
         """
         Initializes the simulation state by running an initial experiment.
 
+        The state is shared through the init cache by every configuration with the same
+        non-degradation parameters, so it is only solved once for all of them.
+
         Returns:
         - StateModel if the initialization succeeded, otherwise False.
         """
+        if self.init_cache is not None:
+            state = self.init_cache.read_state(self.init_key)
+            if state is not None:
+                logging.info("Using cached initialization state")
+                return state
         solution = self.run_experiment(
             experiment=self.experiments.init, last_state=None, initial_soc=1
         )
@@ -361,65 +957,329 @@ class PyBammWrapper:
             logging.error("Error occurred during the initialization experiment.")
             return None
 
-        return StateModel(solution, solution.last_state)
+        state = StateModel(None, LeanState.from_solution(solution))
+        if self.init_cache is not None:
+            try:
+                self.init_cache.save_state(self.init_key, state, self.degradation)
+            except OSError as e:
+                logging.warning(f"Initialization state could not be cached: {e}")
+        return state
+
+    def needs_capacity_test(self, cycle) -> bool:
+        """
+        Whether the simulated capacity test runs before the main experiment of cycle,
+        according to the capacity schedule. It always runs while the state holds no
+        SoC normalisation to reuse.
+        """
+        if self.state.soc_normalisation is None:
+            return True
+        return self.capacity_schedule.runs_capacity_test(
+            cycle, self.dataset.get_capacity_test_cycles()
+        )
 
     def run_capacity_experiment(self, output_capacity, cycle):
         return self.dataset.get_metric_capacity_experiment(output_capacity, cycle)
 
-    def run_main_experiment(self, cycle):
+    def run_main_experiment(self, cycle, n_cycles=1):
         """
         Runs the main experiment for the given cycle and updates the state.
 
         Parameters:
         - cycle (int): The cycle number to run the main experiment for.
+        - n_cycles (int): Consecutive main cycles solved in one call, see
+          run_main_experiment_cycles.
 
         Returns:
         - bool: True if the experiment ran successfully, False otherwise.
         """
+        if n_cycles > 1:
+            return self.run_main_experiment_cycles(cycle, n_cycles)
+        if self.runs_capacity_test_concurrently(cycle):
+            return self.run_main_experiment_concurrently(cycle)
+        success, sol_capacity = self.run_scheduled_capacity_test(cycle)
+        if not success:
+            return None
+
+        solution = self.run_experiment(
+            experiment=self.experiments.main,
+            last_state=self.state.last_ModelState,
+            initial_soc=None,
+        )
+        if not self.success:
+            logging.error("Error running main experiment.")
+            return False
+
+        self.log_time_sol(solution)
+        self.update_state_with_solution(solution, sol_capacity, cycle)
+        return True
+
+    def run_scheduled_capacity_test(self, cycle):
+        """
+        Runs the capacity test before cycle if the schedule asks for it and updates the
+        SoC normalisation with it, otherwise reuses the last normalisation.
+
+        Returns:
+        - Tuple[bool, Optional[pybamm.Solution]]: Whether the normalisation is ready,
+          and the capacity test solution if it ran.
+        """
+        if not self.needs_capacity_test(cycle):
+            self.min_discharge, self.max_discharge = self.state.soc_normalisation
+            logging.info(
+                f"Capacity test skipped on cycle {cycle}, reusing min discharge "
+                f"{self.min_discharge} - max discharge {self.max_discharge}"
+            )
+            return True, None
         sol_capacity = self.run_test_capacity()
         if sol_capacity is None:
-            return None
+            return False, None
         self.update_discharge_capacity(sol_capacity)
+        self.state.soc_normalisation = (self.min_discharge, self.max_discharge)
         logging.info("Updated discharge capacity")
+        return True, sol_capacity
+
+    def get_cycles_per_solve(self, cycle, last_cycle) -> int:
+        """
+        Main cycles solved together from cycle: up to cycles_per_solve and last_cycle,
+        and none past the next cycle with a scheduled capacity test. The SoC
+        normalisation is an input of the solve, so every cycle of a solve uses the one
+        of its first cycle, as they would solved one by one.
+        """
+        available_cycles = self.dataset.get_capacity_test_cycles()
+        max_cycles = min(self.cycles_per_solve, last_cycle - cycle + 1)
+        n_cycles = 1
+        while n_cycles < max_cycles and not self.capacity_schedule.runs_capacity_test(
+            cycle + n_cycles, available_cycles
+        ):
+            n_cycles += 1
+        return n_cycles
+
+    def run_main_experiment_cycles(self, cycle, n_cycles):
+        """
+        Solves n_cycles main cycles from the current state in a single experiment,
+        which saves the setup of a solve per cycle, and adds them to the state at once.
+        Only the first cycle may have a capacity test, see get_cycles_per_solve.
+
+        Parameters:
+        - cycle (int): First cycle to simulate.
+        - n_cycles (int): Number of cycles to simulate.
 
+        Returns:
+        - bool: True if every cycle ran successfully, False otherwise.
+        """
+        success, sol_capacity = self.run_scheduled_capacity_test(cycle)
+        if not success:
+            return None
         solution = self.run_experiment(
-            experiment=self.experiments.main,
+            experiment=self.get_main_experiment(n_cycles),
             last_state=self.state.last_ModelState,
             initial_soc=None,
         )
+        if not self.success or len(solution.cycles) < n_cycles:
+            logging.error(f"Error running main experiment of {n_cycles} cycles.")
+            self.success = False
+            return False
+        self.log_time_sol(solution)
+        with stage("pybamm_output"):
+            outputs = PybammOutput.split_cycles(solution, n_cycles)
+        # The solution also holds the cycles of the starting solution
+        new_cycles = solution.cycles[-n_cycles:]
+
+        for index, output in enumerate(outputs):
+            output_capacity = None
+            if index == 0 and sol_capacity is not None:
+                output_capacity = PybammOutput(sol_capacity)
+            if not self.add_cycle_to_state(
+                output,
+                output_capacity,
+                new_cycles[index].last_state,
+                cycle + index,
+            ):
+                break
+        self.save_and_publish_state()
+        return self.success and len(self.state) >= cycle + n_cycles
+
+    def get_main_experiment(self, n_cycles) -> pybamm.Experiment:
+        """
+        Returns the main experiment repeated n_cycles times, built from fresh copies of
+        its steps, as building a simulation mutates the steps of its experiment.
+        """
+        if n_cycles == 1:
+            return self.experiments.main
+        if n_cycles not in self.main_experiments:
+            operating_conditions, *options = copy.deepcopy(self.main_experiment_args)
+            experiment = pybamm.Experiment(operating_conditions * n_cycles, *options)
+            self.main_experiments[n_cycles] = experiment
+            self.experiment_signatures[
+                self.get_experiment_name(experiment)
+            ] = get_experiment_signature(experiment)
+        return self.main_experiments[n_cycles]
+
+    def runs_capacity_test_concurrently(self, cycle) -> bool:
+        """
+        The capacity test runs alongside the main experiment when the schedule asks for
+        it and a previous normalisation exists for the main experiment to use.
+        """
+        return (
+            self.capacity_schedule.concurrent
+            and self.state.soc_normalisation is not None
+            and self.needs_capacity_test(cycle)
+        )
+
+    def run_main_experiment_concurrently(self, cycle):
+        """
+        Runs the capacity test of the cycle in a forked process while the main
+        experiment runs in this one. Both start from the same state. The main
+        experiment uses the SoC normalisation of the previous capacity test, since the
+        current one is only known once both have finished.
+
+        Parameters:
+        - cycle (int): The cycle number to run the main experiment for.
+
+        Returns:
+        - bool: True if both experiments ran successfully, False otherwise.
+        """
+        # Built before forking, so the child process inherits it
+        self.get_simulation(self.experiments.capacity, 1)
+        context = multiprocessing.get_context("fork")
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=self.run_capacity_test_process, args=(sender,))
+        process.start()
+        sender.close()
+
+        self.min_discharge, self.max_discharge = self.state.soc_normalisation
+        try:
+            solution = self.run_experiment(
+                experiment=self.experiments.main,
+                last_state=self.state.last_ModelState,
+                initial_soc=None,
+            )
+        finally:
+            capacity_result = self.receive_capacity_test(receiver, process)
         if not self.success:
             logging.error("Error running main experiment.")
             return False
+        if capacity_result is None:
+            logging.error("Error running the concurrent capacity test.")
+            return False
 
+        self.min_discharge, self.max_discharge, output_capacity = capacity_result
+        self.state.soc_normalisation = (self.min_discharge, self.max_discharge)
+        logging.info("Updated discharge capacity for the next cycle")
         self.log_time_sol(solution)
-        self.update_state_with_solution(solution, sol_capacity, cycle)
+        self.update_state_with_solution(
+            solution, None, cycle, output_capacity=output_capacity
+        )
         return True
 
-    def update_state_with_solution(self, solution, solution_capacity, cycle):
+    def run_capacity_test_process(self, sender):
+        """
+        Entry point of the process solving the capacity test concurrently. Sends back
+        the new normalisation and the capacity test output, or None if it failed.
+        """
+        result = None
+        try:
+            solution = self.run_test_capacity()
+            if solution is not None and self.success:
+                self.update_discharge_capacity(solution)
+                with stage("pybamm_output", experiment="capacity"):
+                    output_capacity = PybammOutput(solution)
+                result = (self.min_discharge, self.max_discharge, output_capacity)
+        except Exception as e:
+            logging.error(f"Concurrent capacity test failed: {e}")
+        sender.send(result)
+        sender.close()
+
+    @staticmethod
+    def receive_capacity_test(receiver, process):
+        try:
+            result = receiver.recv()
+        except EOFError:
+            logging.error(f"Capacity test process exited with code {process.exitcode}")
+            result = None
+        receiver.close()
+        process.join()
+        return result
+
+    def update_state_with_solution(
+        self, solution, solution_capacity, cycle, output_capacity=None
+    ):
         """
         Updates the simulation state with the results from the latest experiment.
 
         Parameters:
         - solution: The solution object from the latest PyBaMM simulation.
+        - solution_capacity: The capacity test solution, None if it was skipped.
         - cycle (int): The cycle number of the simulation.
+        - output_capacity: The capacity test output, when it was already built by the
+          process that solved it.
         """
-        output = PybammOutput(solution)
-        output_capacity = PybammOutput(solution_capacity)
-        info = self.get_info(output, output_capacity, cycle)
+        with stage("pybamm_output"):
+            output = PybammOutput(solution)
+            if output_capacity is None and solution_capacity is not None:
+                output_capacity = PybammOutput(solution_capacity)
+        if not self.add_cycle_to_state(
+            output, output_capacity, solution.last_state, cycle
+        ):
+            return
+        self.save_and_publish_state()
+
+    def add_cycle_to_state(self, output, output_capacity, last_state, cycle) -> bool:
+        """
+        Computes the metrics of a simulated cycle and adds it to the state in memory.
+
+        Returns:
+        - bool: True if the metrics could be computed, False otherwise.
+        """
+        if not self.state.last_ModelState.holds(DISCHARGE_CAPACITY):
+            logging.warning(
+                f"Cycle {cycle} started from a state without the discharge capacity, "
+                "its metrics read the time integral of the counter"
+            )
+            output = integrate_discharge_capacity(output)
+        with stage("metrics"):
+            info = self.get_info(output, output_capacity, cycle)
         logging.info(info)
         if info is None:
             logging.error("Failed to obtain metrics from the solution.")
             self.success = False
-            return
+            return False
 
         logging.info(f"State metric len START {len(self.state)}")
-
         self.state.add_solution(
-            output=output, last_state=solution.last_state, cycle=cycle, info=info
+            output=output, last_state=last_state, cycle=cycle, info=info
         )
-        self.state.save_state(state_path=self.state_path)
+        if self.keep_outputs:
+            self.outputs[cycle] = output
+        return True
+
+    def save_and_publish_state(self):
+        with stage("state_save"):
+            if self.state_path is not None:
+                self.state.save_state(state_path=self.state_path)
+            self.save_metrics_index()
+            self.publish_state()
         logging.info(f"State metric len END {len(self.state)}")
-        self.param
+
+    def save_metrics_index(self):
+        """
+        Mirrors the metrics of the state into the lightweight index read by BMO_CLI.py
+        to answer already simulated cycles without loading PyBaMM.
+        """
+        if self.state_path is None:
+            return
+        index_path = MetricsIndex.get_path(self.state_path)
+        MetricsIndex.from_state(self.state, self.degradation).save(index_path)
+
+    def save_censored(self, cycle, record: dict):
+        """
+        Records in the metrics index that the run requested for cycle was stopped
+        early by a cost bound, see MetricsIndex.
+        """
+        if self.state_path is None:
+            return
+        index = MetricsIndex.from_state(self.state, self.degradation)
+        index.censored[str(cycle)] = record
+        index.save(MetricsIndex.get_path(self.state_path))
 
     def extract_metric(self, cycle):
         """
@@ -447,9 +1307,12 @@ class PyBammWrapper:
                 output, cycle
             )
             degradation_metric = self.dataset.get_metric_degradation(output, cycle)
-            (capacity_metric, experimental_capacity) = self.run_capacity_experiment(
-                output_capacity, cycle
-            )
+            if output_capacity is None:
+                (capacity_metric, experimental_capacity) = (None, None)
+            else:
+                (capacity_metric, experimental_capacity) = (
+                    self.run_capacity_experiment(output_capacity, cycle)
+                )
             model_metrics = ModelMetrics(
                 non_degradation_metric=non_degradation_metric,
                 degradation_metrics=degradation_metric,
@@ -459,7 +1322,9 @@ class PyBammWrapper:
         else:
             model_metrics = ModelMetrics()
 
-        capacity_value = self.get_real_capacity(output_capacity)
+        capacity_value = (
+            None if output_capacity is None else self.get_real_capacity(output_capacity)
+        )
         model_status = ModelStatus(real_capacity=capacity_value)
         return PybammInfo(model_metrics=model_metrics, model_status=model_status)
 
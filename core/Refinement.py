@@ -0,0 +1,229 @@
+import copy
+import logging
+import os
+import re
+from dataclasses import dataclass, field, fields
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from core.ModelParameters import ModelParameters
+from core.Parameters.NonDegradationParameters import NonDegradationParameters
+from core.PyBammWrapper import PyBammWrapper
+from scipy.optimize import least_squares
+
+PARAMETERS_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "parameters",
+    "parameters_non_degradation.txt",
+)
+# Residual of every point of a simulation that failed, as MAX_METRIC_VALUE of the
+# datasets
+FAILED_RESIDUAL = 10.0
+# irace parameter line: name "--option " type (lower, upper)
+_RANGE_LINE = re.compile(r'^\s*(\w+)\s+"--(\w+)\s*"\s+[ri]\s+\(([^,]+),([^)]+)\)')
+
+
+def read_parameter_ranges(
+    parameters_file: str = PARAMETERS_FILE,
+) -> Dict[str, Tuple[float, float]]:
+    """
+    Reads the ranges of the real and integer parameters of an irace parameters file.
+
+    Returns:
+    - Dict[str, Tuple[float, float]]: Lower and upper bound by command line option.
+    """
+    ranges = {}
+    with open(parameters_file, "r") as file:
+        for line in file:
+            match = _RANGE_LINE.match(line)
+            if match:
+                name, lower, upper = match.group(2, 3, 4)
+                ranges[name] = (float(lower), float(upper))
+    return ranges
+
+
+@dataclass
+class RefinementResult:
+    """
+    Attributes:
+        model_parameters (ModelParameters): The elite with the refined values.
+        values (dict): Refined value of every tuned parameter, by option.
+        initial_rmse (float): RMSE of the residuals of the elite.
+        rmse (float): RMSE of the residuals of the refined parameters.
+        evaluations (int): Residual evaluations run, finite differences included.
+        message (str): Termination reason of the least-squares solver.
+    """
+
+    model_parameters: ModelParameters
+    values: Dict[str, float]
+    initial_rmse: float
+    rmse: float
+    evaluations: int
+    message: str
+
+
+@dataclass
+class Refinement:
+    """
+    Polishes an elite configuration with a bounded least-squares fit of the residuals
+    compared by the non-degradation metric, on the given batteries and cycles.
+
+    The tuned parameters are normalised to [0, 1] within their ranges. The Jacobian
+    is obtained by forward finite differences, each column being one evaluation of
+    the population, so evaluations tuning input parameters reuse the simulations
+    discretised for the elite.
+
+    Attributes:
+        template (PyBammWrapper): Wrapper whose settings the evaluations copy.
+        elite (ModelParameters): Parameters the refinement starts from.
+        ranges (dict): Lower and upper bound of every tuned parameter, by option.
+        batteries (List[str]): Batteries whose residuals are fitted.
+        cycles (List[int]): Cycles whose residuals are fitted, as --n_cycle.
+        evaluations (int): Residual evaluations run so far.
+        n_residuals (Optional[int]): Size of the residual vector, once known.
+        initial_rmse (Optional[float]): RMSE of the first evaluation, the elite's.
+    """
+
+    template: PyBammWrapper
+    elite: ModelParameters
+    ranges: Dict[str, Tuple[float, float]]
+    batteries: List[str]
+    cycles: List[int]
+    evaluations: int = field(init=False, default=0)
+    n_residuals: Optional[int] = field(init=False, default=None)
+    initial_rmse: Optional[float] = field(init=False, default=None)
+
+    def __post_init__(self):
+        options = {parameter.name for parameter in fields(NonDegradationParameters)}
+        unknown = [name for name in self.ranges if name not in options]
+        if unknown:
+            raise ValueError(
+                "Only non-degradation parameters can be refined, got "
+                f"{', '.join(unknown)}"
+            )
+        self.template.keep_outputs = True
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.ranges)
+
+    def to_unit(self, values: Dict[str, float]) -> np.ndarray:
+        lower, upper = np.array(list(self.ranges.values())).T
+        x = np.array([values[name] for name in self.names])
+        return np.clip((x - lower) / (upper - lower), 0.0, 1.0)
+
+    def from_unit(self, x: np.ndarray) -> Dict[str, float]:
+        lower, upper = np.array(list(self.ranges.values())).T
+        return dict(zip(self.names, (lower + x * (upper - lower)).tolist()))
+
+    def get_elite_values(self) -> Dict[str, float]:
+        """
+        Values of the tuned parameters in the elite, the middle of their range when
+        the elite leaves them to the parameter set.
+        """
+        values = {}
+        for name, (lower, upper) in self.ranges.items():
+            value = getattr(self.elite.non_degradation_parameters, name)
+            if value is None:
+                logging.warning(f"{name} not set in the elite, starting mid-range")
+                value = (lower + upper) / 2
+            values[name] = value
+        return values
+
+    def get_model_parameters(self, values: Dict[str, float]) -> ModelParameters:
+        model_parameters = copy.deepcopy(self.elite)
+        model_parameters.update_param_non_degradation(**values)
+        return model_parameters
+
+    def get_battery_residuals(
+        self, model_parameters: ModelParameters, battery: str
+    ) -> Optional[np.ndarray]:
+        """
+        Simulates the cycles of a battery and returns their residuals, concatenated,
+        or None if a simulation or the residuals failed.
+        """
+        try:
+            member = self.template.get_population_member(
+                model_parameters, battery, self.evaluations
+            )
+            member.evaluate_cycles(max(self.cycles) + 1)
+        except Exception as e:
+            logging.error(f"Refinement evaluation on {battery} failed: {e}")
+            return None
+        residuals = []
+        for cycle in self.cycles:
+            if cycle not in member.outputs:
+                return None
+            result = member.dataset.get_residuals_non_degradation(
+                member.outputs[cycle], cycle
+            )
+            if result is None:
+                return None
+            residuals.append(result)
+        return np.concatenate(residuals)
+
+    def get_residuals(self, x: np.ndarray) -> np.ndarray:
+        """
+        Residuals of the normalised parameters x on every battery and cycle. Failed
+        simulations get FAILED_RESIDUAL on each of their points.
+
+        Raises:
+        - ValueError: If the residuals of the first evaluation, the elite's, failed,
+          as the size of the residual vector is unknown.
+        """
+        values = self.from_unit(x)
+        model_parameters = self.get_model_parameters(values)
+        residuals = [
+            self.get_battery_residuals(model_parameters, battery)
+            for battery in self.batteries
+        ]
+        self.evaluations += 1
+
+        if any(result is None for result in residuals):
+            if self.n_residuals is None:
+                raise ValueError("The elite could not be evaluated")
+            result = np.full(self.n_residuals, FAILED_RESIDUAL)
+        else:
+            result = np.concatenate(residuals)
+        if self.n_residuals is None:
+            self.n_residuals = len(result)
+            self.initial_rmse = get_rmse(result)
+        logging.info(
+            f"Refinement evaluation {self.evaluations}: {values}, "
+            f"RMSE {get_rmse(result)}"
+        )
+        return result
+
+    def run(
+        self, diff_step: float = 0.01, max_evaluations: int = 50
+    ) -> RefinementResult:
+        """
+        Runs the bounded least-squares fit from the elite.
+
+        Parameters:
+        - diff_step: Finite difference step, as a share of the parameter ranges.
+        - max_evaluations: Maximum residual evaluations of the fit, without the ones
+          of the finite differences.
+        """
+        fit = least_squares(
+            self.get_residuals,
+            self.to_unit(self.get_elite_values()),
+            jac="2-point",
+            bounds=(0.0, 1.0),
+            diff_step=diff_step,
+            max_nfev=max_evaluations,
+        )
+        values = self.from_unit(fit.x)
+        logging.info(f"Refinement finished: {fit.message}")
+        return RefinementResult(
+            model_parameters=self.get_model_parameters(values),
+            values=values,
+            initial_rmse=self.initial_rmse,
+            rmse=get_rmse(fit.fun),
+            evaluations=self.evaluations,
+            message=fit.message,
+        )
+
+
+def get_rmse(residuals: np.ndarray) -> float:
+    return float(np.sqrt(np.mean(residuals**2)))
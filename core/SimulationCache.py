@@ -0,0 +1,158 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import pybamm
+from core.DatasetBase import Experiments
+from core.MetricsIndex import MetricsIndex
+from core.ModelState import StateModel
+
+# Bump whenever a change in the simulation or metrics code invalidates cached results
+SIMULATION_CODE_VERSION = "3"
+
+
+def canonical_hash(data: dict) -> str:
+    """
+    Hashes a JSON-serializable description so that equal descriptions get the same
+    key regardless of key order or of the process computing it.
+    """
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+@dataclass
+class SimulationCache:
+    """
+    Content-addressed store of simulation states, shared by every configuration,
+    run and campaign using the same cache path.
+
+    States are keyed by a canonical hash of everything that determines the simulation
+    (see PyBammWrapper.get_simulation_key) instead of by irace's configuration id, so
+    configurations with identical parameters reuse each other's cycles. Each state is
+    stored with its metrics index, which tells how many cycles it holds without
+    unpickling it.
+    """
+
+    cache_path: str
+    namespace: str = "states"
+
+    def __post_init__(self):
+        os.makedirs(os.path.join(self.cache_path, self.namespace), exist_ok=True)
+
+    def get_state_path(self, key: str) -> str:
+        return os.path.join(self.cache_path, self.namespace, f"{key}_state.Wp")
+
+    def cached_cycles(self, key: str) -> int:
+        index = MetricsIndex.read(MetricsIndex.get_path(self.get_state_path(key)))
+        return 0 if index is None else len(index)
+
+    def read_state(self, key: str, min_cycles: int = 0) -> Optional[StateModel]:
+        """
+        Returns the cached state for key if it holds more than min_cycles cycles.
+        """
+        state_path = self.get_state_path(key)
+        if not Path(state_path).exists() or self.cached_cycles(key) < min_cycles:
+            return None
+        try:
+            with open(state_path, "rb") as file:
+                state = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logging.warning(f"Cached state {state_path} could not be read: {e}")
+            return None
+        logging.info(f"Cached state found for key {key} with {len(state)} cycles")
+        return state
+
+    def save_state(self, key: str, state: StateModel, degradation: bool):
+        """
+        Publishes a state unless the cache already holds at least as many cycles.
+        Files are replaced atomically, as several workers may share the cache.
+        """
+        if self.cached_cycles(key) >= len(state) and Path(
+            self.get_state_path(key)
+        ).exists():
+            return
+        state_path = self.get_state_path(key)
+        tmp_path = f"{state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump(state, file)
+        os.replace(tmp_path, state_path)
+        MetricsIndex.from_state(state, degradation).save(
+            MetricsIndex.get_path(state_path)
+        )
+        logging.info(f"State with {len(state)} cycles cached for key {key}")
+
+    def get_simulation_path(self, key: str) -> str:
+        return os.path.join(self.cache_path, self.namespace, f"{key}_sim.pkl")
+
+    def read_simulation(self, key: str) -> Optional[pybamm.Simulation]:
+        """
+        Returns the built simulation stored for key, if any.
+        """
+        simulation_path = self.get_simulation_path(key)
+        if not Path(simulation_path).exists():
+            return None
+        try:
+            return pybamm.load_sim(simulation_path)
+        except Exception as e:
+            logging.warning(f"Cached simulation {simulation_path} could not be read: {e}")
+            return None
+
+    def save_simulation(self, key: str, sim: pybamm.Simulation):
+        """
+        Stores a built simulation. Simulations that cannot be pickled, such as those
+        of experiments with local termination functions, are skipped.
+        """
+        simulation_path = self.get_simulation_path(key)
+        if Path(simulation_path).exists():
+            return
+        tmp_path = f"{simulation_path}.{os.getpid()}.tmp"
+        try:
+            sim.save(tmp_path)
+            os.replace(tmp_path, simulation_path)
+            logging.info(f"Simulation cached for key {key}")
+        except Exception as e:
+            logging.warning(f"Simulation could not be cached: {e}")
+            if Path(tmp_path).exists():
+                os.remove(tmp_path)
+
+    def get_experiments_path(self, key: str) -> str:
+        return os.path.join(self.cache_path, self.namespace, f"{key}_experiments.pkl")
+
+    def read_experiments(self, key: str) -> Optional[Experiments]:
+        """
+        Returns the experiments stored for key, if any.
+        """
+        experiments_path = self.get_experiments_path(key)
+        if not Path(experiments_path).exists():
+            return None
+        try:
+            with open(experiments_path, "rb") as file:
+                return pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+            logging.warning(
+                f"Cached experiments {experiments_path} could not be read: {e}"
+            )
+            return None
+
+    def save_experiments(self, key: str, experiments: Experiments):
+        """
+        Stores the experiments of a dataset, before any simulation mutates them.
+        """
+        experiments_path = self.get_experiments_path(key)
+        if Path(experiments_path).exists():
+            return
+        tmp_path = f"{experiments_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as file:
+                pickle.dump(experiments, file)
+            os.replace(tmp_path, experiments_path)
+            logging.info(f"Experiments cached for key {key}")
+        except Exception as e:
+            logging.warning(f"Experiments could not be cached: {e}")
+            if Path(tmp_path).exists():
+                os.remove(tmp_path)
@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import socket
+import socketserver
+from typing import List, Optional
+
+from core.environment import MAX_VALUE
+
+DAEMON_SOCKET_ENV = "BMO_DAEMON_SOCKET"
+CONNECT_TIMEOUT = 5
+# Settings of the evaluations read from the environment, besides the variables
+# named by their arguments
+SETTINGS_PREFIX = "BMO_"
+
+
+def get_request_environment(kwargs) -> dict:
+    """
+    Environment the evaluation depends on: the variables named by its arguments,
+    such as the dataset, inputs and results paths, and the BMO_* settings.
+    """
+    names = {value for value in kwargs.values() if isinstance(value, str)}
+    return {
+        name: value
+        for name, value in os.environ.items()
+        if name in names or name.startswith(SETTINGS_PREFIX)
+    }
+
+
+def request_simulation(socket_path: Optional[str], kwargs) -> Optional[str]:
+    """
+    Sends a simulation request to the simulation daemon listening on socket_path.
+
+    Only the standard library is used here, so BMO_CLI.py can act as a thin client
+    without importing PyBaMM.
+
+    Parameters:
+    - socket_path: Path of the daemon Unix socket, or None if no daemon is configured.
+    - kwargs: Command line arguments of the evaluation, forwarded as they are. The
+      part of the client environment they depend on is forwarded with them, as
+      several arguments name the environment variables holding the dataset, inputs
+      and results paths, see get_request_environment.
+
+    Returns:
+    - The result string of the evaluation, MAX_VALUE if the daemon accepted the request
+      but failed to answer it, or None if no daemon could be reached.
+    """
+    if not socket_path or not os.path.exists(socket_path):
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.settimeout(CONNECT_TIMEOUT)
+        client.connect(socket_path)
+    except OSError as e:
+        logging.info(f"Simulation daemon not reachable at {socket_path}: {e}")
+        client.close()
+        return None
+    try:
+        # Timeouts are enforced by the daemon, as they are in a local run
+        client.settimeout(None)
+        with client.makefile("rwb") as stream:
+            request = {"kwargs": kwargs, "environment": get_request_environment(kwargs)}
+            stream.write(json.dumps(request).encode() + b"\n")
+            stream.flush()
+            response = stream.readline()
+        return str(json.loads(response)["result"])
+    except (OSError, ValueError, KeyError) as e:
+        logging.error(f"Simulation daemon failed answering the request: {e}")
+        return MAX_VALUE
+    finally:
+        client.close()
+
+
+class SimulationRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handles one evaluation per connection. The handler runs in a child forked from
+    the daemon, so it inherits the loaded parameter sets and built models.
+    """
+
+    def handle(self):
+        from core.SimulationRunner import run_simulation
+
+        try:
+            request = json.loads(self.rfile.readline())
+            environment = request["environment"]
+            # Settings of the daemon the client did not set must not apply either
+            for name in list(os.environ):
+                if name.startswith(SETTINGS_PREFIX) and name not in environment:
+                    del os.environ[name]
+            os.environ.update(environment)
+            result = run_simulation(request["kwargs"])
+        except Exception as e:
+            logging.error(f"Simulation request failed: {e}")
+            result = MAX_VALUE
+        self.wfile.write(json.dumps({"result": result}).encode() + b"\n")
+
+
+class SimulationDaemon(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    """
+    Long-lived per-node worker that keeps PyBaMM, the parameter sets, the models,
+    the experiments, the experimental data and the built simulations warm and serves
+    the evaluations requested by BMO_CLI.py over a Unix socket.
+    """
+
+    def __init__(self, socket_path: str, max_children: Optional[int] = None):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.max_children = max_children or os.cpu_count()
+        self.socket_path = socket_path
+        # Bound by activate, so the socket only appears once the daemon is warm
+        super().__init__(
+            socket_path, SimulationRequestHandler, bind_and_activate=False
+        )
+
+    def activate(self):
+        """
+        Binds the socket and starts listening on it.
+        """
+        try:
+            self.server_bind()
+            self.server_activate()
+        except BaseException:
+            self.server_close()
+            raise
+
+    def warm_up(self, instances: Optional[List[dict]] = None):
+        """
+        Loads the parameter set and the models, then warms up every instance, given
+        as the arguments of BMO_CLI.py, before any request is forked: its
+        experiments, its simulations built with the base parameters and the
+        experimental data of its cycles. An instance that fails is only logged.
+        """
+        from core.PyBammWrapper import warm_up
+        from core.SimulationRunner import warm_up_instance
+
+        logging.info("Warming up simulation daemon")
+        warm_up()
+        for kwargs in instances or []:
+            logging.info(
+                f"Warming up battery {kwargs.get('battery_id')} up to cycle "
+                f"{kwargs.get('n_cycle')}"
+            )
+            try:
+                warm_up_instance(kwargs)
+            except Exception as e:
+                logging.error(f"Instance {kwargs} not warmed up: {e}")
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
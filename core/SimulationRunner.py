@@ -0,0 +1,490 @@
+import logging
+import os
+import queue
+import sys
+import time
+from multiprocessing import Process, Queue
+
+from core import ModelParameters, Telemetry
+from core.CapacitySchedule import CapacitySchedule
+from core.DriveCycle import DriveCycle
+from core.environment import (
+    MAX_VALUE,
+    lookup_evaluation_metric,
+    setup_environment,
+    setup_logging,
+    setup_paths,
+    setup_telemetry,
+)
+from core.Fidelity import (
+    FIDELITY_AUTO,
+    FIDELITY_HIGH,
+    FIDELITY_LOW,
+    FIDELITY_SPME,
+    get_fidelity_mode,
+    get_fidelity_threshold,
+    get_prescreen_cost,
+    get_prescreen_threshold,
+    should_escalate,
+)
+from core.Placement import PlacementPolicy, apply_placement
+from core.Parameters.DegradationParameters import DegradationParameters
+from core.PyBammWrapper import PyBammWrapper, load_parameter_values
+
+MAX_TIMEOUT_NO_DEGRADATION = 60 * 60
+MAX_TIMEOUT_DEGRADATION = 60 * 60 * 5
+MAX_TIMEOUT = MAX_TIMEOUT_NO_DEGRADATION
+HEARTBEAT_POLL = 10
+HEARTBEAT_INIT = "init"
+HEARTBEAT_CYCLE = "cycle"
+HEARTBEAT_DONE = "done"
+HEARTBEAT_CENSORED = "censored"
+COST_BOUND_ENV = "BMO_COST_BOUND"
+# The partial mean must exceed the bound by this margin to stop a run early
+COST_BOUND_MARGIN = 0.1
+COST_BOUND_MIN_CYCLES = 2
+CENSORED_COST_ENV = "BMO_CENSORED_COST"
+CENSORED_COST_BOUND = "bound"
+CENSORED_COST_INF = "inf"
+CENSORED_COST_MODES = (CENSORED_COST_BOUND, CENSORED_COST_INF)
+CYCLES_PER_SOLVE_ENV = "BMO_CYCLES_PER_SOLVE"
+
+
+class suppress_output_context:
+    def __init__(self, verbose):
+        self.verbose = verbose
+        self.original_stdout_fd = sys.stdout.fileno()
+        self.original_stderr_fd = sys.stderr.fileno()
+        self.original_stdout = None
+        self.original_stderr = None
+        self.suppressed = False
+
+    def __enter__(self):
+        if not self.verbose:
+            # Suppress output
+            self.original_stdout = os.dup(self.original_stdout_fd)
+            self.original_stderr = os.dup(self.original_stderr_fd)
+            with open(os.devnull, "wb") as nullfile:
+                null_fd = nullfile.fileno()
+                os.dup2(null_fd, self.original_stdout_fd)
+                os.dup2(null_fd, self.original_stderr_fd)
+            self.suppressed = True
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.suppressed:
+            # Restore the original stdout and stderr
+            os.dup2(self.original_stdout, self.original_stdout_fd)
+            os.dup2(self.original_stderr, self.original_stderr_fd)
+            os.close(self.original_stdout)
+            os.close(self.original_stderr)
+            self.suppressed = False
+
+
+def run_simulation(kwargs) -> str:
+    """
+    Creates the PyBaMM model based on provided parameters and runs the simulation.
+
+    Used both by BMO_CLI.py when no simulation daemon is available and by the daemon
+    itself, so timeouts, failures and state files behave the same in both cases.
+    In auto fidelity mode, the evaluation runs at low fidelity and is only run again
+    at high fidelity when its cost falls under the escalation threshold. With a
+    pre-screen threshold, the configuration is first evaluated with the SPMe and
+    only simulated with the DFN if its SPMe cost passes the threshold.
+
+    Parameters:
+    - kwargs: Dictionary of arguments required for the simulation setup and execution.
+
+    Returns:
+    - str: The metric of the requested cycle, or MAX_VALUE if the simulation failed.
+    """
+    fidelity = get_fidelity_mode(kwargs)
+    if fidelity != FIDELITY_SPME and get_prescreen_threshold(kwargs) is not None:
+        screen_result = run_simulation_at_fidelity(kwargs, FIDELITY_SPME)
+        prescreen_cost = get_prescreen_cost(screen_result, kwargs)
+        if prescreen_cost is not None:
+            logging.info(
+                f"Rejected by the SPMe pre-screen with cost {screen_result}, "
+                f"returning {prescreen_cost}"
+            )
+            return prescreen_cost
+    if fidelity != FIDELITY_AUTO:
+        return run_simulation_at_fidelity(kwargs, fidelity)
+    threshold = get_fidelity_threshold(kwargs)
+    result = run_simulation_at_fidelity(kwargs, FIDELITY_LOW)
+    if not should_escalate(result, threshold):
+        logging.info(f"Low fidelity result {result} not escalated (threshold {threshold})")
+        return result
+    logging.info(f"Escalating low fidelity result {result} (threshold {threshold})")
+    return run_simulation_at_fidelity(kwargs, FIDELITY_HIGH)
+
+
+def run_simulation_at_fidelity(kwargs, fidelity) -> str:
+    """
+    Runs the simulation at the given fidelity level, with its own state files.
+    """
+    kwargs = dict(kwargs, fidelity=fidelity)
+    (
+        common_folder_path,
+        parameter_file_path,
+        result_path,
+        state_path,
+        log_path,
+    ) = setup_paths(kwargs)
+    verbose = kwargs.get("verbose")
+    setup_logging(log_path, kwargs.get("log_to_file"), verbose)
+    setup_telemetry(kwargs)
+    Telemetry.set_keys(fidelity=fidelity)
+    apply_placement(PlacementPolicy.from_environment())
+    start_time = time.perf_counter()
+    cycle = kwargs.get("n_cycle")
+    cost_bound = get_cost_bound(kwargs)
+    censored_cost = get_censored_cost_mode(kwargs)
+    result = True
+    with suppress_output_context(verbose=verbose):
+        try:
+            setup_environment(kwargs)
+            model_parameters, pybamm_wrapper = initialize_pybamm_wrapper(
+                parameter_file_path, result_path, state_path, kwargs
+            )
+            if model_parameters.degradation_parameters is None:
+                MAX_TIMEOUT = MAX_TIMEOUT_NO_DEGRADATION
+            else:
+                MAX_TIMEOUT = MAX_TIMEOUT_DEGRADATION
+        except Exception as e:
+            logging.error(f"An error occurred during the Initialization: {e}")
+            result = False
+    if not result:
+        return MAX_VALUE
+    heartbeat_queue = Queue()
+    program = Process(
+        target=run_cycles_with_heartbeat,
+        args=(
+            pybamm_wrapper,
+            cycle,
+            heartbeat_queue,
+            verbose,
+            cost_bound,
+            censored_cost,
+        ),
+    )
+    program.start()
+    logging.info(f"Starting simulation process for cycle {cycle}")
+    # The first cycle of a multi-cycle solve only reports once all of them are done
+    result = supervise_cycles(
+        program, heartbeat_queue, MAX_TIMEOUT * pybamm_wrapper.cycles_per_solve
+    )
+
+    if result is None:
+        result = f"{MAX_VALUE}"
+    else:
+        result = f"{result}"
+    logging.info(f"Simulation result for cycle {cycle}: {result}")
+    Telemetry.record(
+        "evaluation", time.perf_counter() - start_time, success=result != MAX_VALUE
+    )
+    return result
+
+
+def evaluate(kwargs) -> str:
+    """
+    Evaluates one (configuration, instance) pair as BMO_CLI.py does, answering
+    already simulated cycles from the metrics index before running the simulation.
+    """
+    cycle = kwargs.get("n_cycle")
+    if cycle is None:
+        return MAX_VALUE
+    simulated, metric = lookup_evaluation_metric(kwargs, cycle)
+    if simulated:
+        return MAX_VALUE if metric is None else f"{metric}"
+    return run_simulation(kwargs)
+
+
+def get_cost_bound(kwargs):
+    """
+    Returns the cost bound given by the optimizer, from the --cost_bound option or the
+    BMO_COST_BOUND environment variable, or None when runs must not stop early.
+    """
+    cost_bound = kwargs.get("cost_bound")
+    if cost_bound is None:
+        cost_bound = os.getenv(COST_BOUND_ENV)
+    if cost_bound is None or f"{cost_bound}" == MAX_VALUE:
+        return None
+    return float(cost_bound)
+
+
+def get_censored_cost_mode(kwargs) -> str:
+    """
+    Returns how censored runs report their cost, from the --censored_cost option or
+    the BMO_CENSORED_COST environment variable, inf by default.
+    """
+    mode = kwargs.get("censored_cost") or os.getenv(CENSORED_COST_ENV)
+    mode = (mode or CENSORED_COST_INF).lower()
+    if mode not in CENSORED_COST_MODES:
+        raise ValueError(
+            f"Unknown censored cost {mode}, available: {', '.join(CENSORED_COST_MODES)}"
+        )
+    return mode
+
+
+def get_censored_cost(partial_cost, cost_bound, mode):
+    """
+    Cost reported for a run stopped before its requested cycle. The partial cost is
+    not a metric of that cycle, so it is never reported as one: bound reports the
+    largest of the bound and the partial cost, so the configuration ranks no better
+    than the elites on the instance, and inf reports MAX_VALUE, as a failed run.
+    """
+    if mode == CENSORED_COST_INF:
+        return MAX_VALUE
+    return max(cost_bound, partial_cost)
+
+
+def get_cycles_per_solve(kwargs) -> int:
+    """
+    Returns the main cycles solved in one experiment, from the --cycles_per_solve
+    option or the BMO_CYCLES_PER_SOLVE environment variable, 1 by default.
+    """
+    cycles_per_solve = kwargs.get("cycles_per_solve")
+    if cycles_per_solve is None:
+        cycles_per_solve = os.getenv(CYCLES_PER_SOLVE_ENV, 1)
+    return max(int(cycles_per_solve), 1)
+
+
+def get_partial_cost(current_pybamm: PyBammWrapper):
+    """
+    Mean metric of the cycles simulated so far, failed cycles counting as infinite.
+    """
+    metrics = [
+        current_pybamm.extract_metric(cycle)
+        for cycle in range(current_pybamm.__len_metrics__())
+    ]
+    if not metrics:
+        return None
+    return sum(float("inf") if m is None else m for m in metrics) / len(metrics)
+
+
+def exceeds_cost_bound(current_pybamm: PyBammWrapper, cost_bound) -> bool:
+    """
+    Whether the mean metric of the simulated cycles exceeds the bound by more than
+    COST_BOUND_MARGIN. The bound is a cost of the requested cycle while the mean
+    covers the earlier ones, so this predicts that the requested cycle won't beat
+    the bound rather than proving it: a configuration whose metric drops by more
+    than the margin over the remaining cycles is stopped too.
+    """
+    if cost_bound is None or current_pybamm.__len_metrics__() < COST_BOUND_MIN_CYCLES:
+        return False
+    partial_cost = get_partial_cost(current_pybamm)
+    return partial_cost > cost_bound * (1 + COST_BOUND_MARGIN)
+
+
+def get_cycles_to_simulate(current_pybamm: PyBammWrapper, cycle):
+    last_cycle_simulated = current_pybamm.__len_metrics__() - 1
+    if last_cycle_simulated >= cycle:
+        return [cycle]
+    return range(last_cycle_simulated + 1, cycle + 1)
+
+
+def supervise_cycles(program: Process, heartbeat_queue: Queue, timeout):
+    """
+    Follows the heartbeats of the simulation process and enforces the timeout per
+    stage: the initialization and every cycle get `timeout` seconds each.
+
+    Returns:
+    - The metric reported for the last simulated cycle, or None if the process timed
+      out, died or failed.
+    """
+    result = None
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            stage, current_cycle, value = heartbeat_queue.get(
+                timeout=min(HEARTBEAT_POLL, max(deadline - time.monotonic(), 0))
+            )
+        except queue.Empty:
+            if time.monotonic() >= deadline:
+                logging.info(f"TimeOut Expired seconds: {timeout}")
+                result = None
+                break
+            if not program.is_alive() and heartbeat_queue.empty():
+                logging.error(
+                    f"Simulation process exited with code {program.exitcode}"
+                )
+                result = None
+                break
+            continue
+        except Exception as e:
+            logging.error(f"An error occurred during the PyBaMM simulation: {e}")
+            result = None
+            break
+
+        if stage == HEARTBEAT_DONE:
+            break
+        if stage == HEARTBEAT_CENSORED:
+            logging.info(f"CENSORED: stopped after cycle {current_cycle}, cost {value}")
+            result = value
+            continue
+        deadline = time.monotonic() + timeout
+        if stage == HEARTBEAT_INIT:
+            if value is None:
+                logging.error(f"An error occurred during the Initialization object")
+                break
+            logging.info("Initialization finished")
+        elif stage == HEARTBEAT_CYCLE:
+            logging.info(f"Cycle {current_cycle} finished with metric {value}")
+            result = value
+
+    heartbeat_queue.close()
+    program.join(timeout=1)
+    if program.is_alive():
+        program.terminate()
+    return result
+
+
+def initialize_pybamm_wrapper(parameter_file_path, result_path, state_path, kwargs):
+    """
+    Initializes model parameters and PyBaMM wrapper for the simulation.
+    """
+    base_param_path = kwargs.get("base_param_path")
+    with Telemetry.stage("model_parameters"):
+        external_param = load_parameter_values()
+        model_parameters = ModelParameters.ModelParameters(
+            file_path=base_param_path, external_param=external_param, **kwargs
+        )
+
+    if kwargs.get("save_param"):
+        model_parameters.save_param(parameter_file_path)
+
+    pybamm_wrapper = PyBammWrapper(
+        id_configuration=kwargs.get("id_configuration"),
+        seed=kwargs.get("seed"),
+        dataset_path=str(os.getenv(kwargs.get("dataset_path"))),
+        result_path=result_path,
+        state_path=state_path,
+        instance_id=kwargs.get("id_instance"),
+        id_dataset=kwargs.get("dataset_id"),
+        id_battery=kwargs.get("battery_id"),
+        model_parameters=model_parameters,
+        cache_path=os.getenv(kwargs.get("cache_path") or ""),
+        drive_cycle_path=os.getenv(kwargs.get("drive_cycle_path") or ""),
+        drive_cycle=DriveCycle.from_kwargs(kwargs),
+        columnar_path=os.getenv(kwargs.get("columnar_path") or ""),
+        solver_name=model_parameters.solver,
+        fidelity=get_fidelity_mode(kwargs),
+        capacity_schedule=CapacitySchedule.from_kwargs(kwargs),
+        cycles_per_solve=get_cycles_per_solve(kwargs),
+    )
+    return model_parameters, pybamm_wrapper
+
+
+def warm_up_instance(kwargs):
+    """
+    Builds the wrapper of an instance, given as the arguments of BMO_CLI.py, with
+    its base parameters, defining its experiments, and warms up its simulations and
+    the experimental data of its cycles up to n_cycle.
+    """
+    kwargs = dict(kwargs, save_param=False)
+    _, pybamm_wrapper = initialize_pybamm_wrapper(
+        None, os.getenv(kwargs.get("result_path")), None, kwargs
+    )
+    pybamm_wrapper.warm_up(kwargs.get("n_cycle") or 0)
+
+
+def create_degradation_parameters(**kwargs):
+    params = DegradationParameters(**kwargs)
+    return params
+
+
+def run_cycles_with_heartbeat(
+    current_pybamm: PyBammWrapper,
+    cycle,
+    heartbeat_queue,
+    verbose=False,
+    cost_bound=None,
+    censored_cost=CENSORED_COST_BOUND,
+):
+    """
+    Initializes the state and simulates every missing cycle up to `cycle` in this
+    process, keeping the state in memory between cycles. A heartbeat is sent after
+    the initialization and after each cycle with its metric.
+
+    With a cost bound, the run stops before simulating any other cycle once the
+    mean metric of the simulated cycles exceeds the bound, see exceeds_cost_bound.
+    The cost given by censored_cost is then sent as censored and recorded in the
+    metrics index. Every simulated cycle is already saved in the state, so a later
+    evaluation resumes from it, and stops right away with the same cost if the bound
+    is the same.
+    """
+    with suppress_output_context(verbose=verbose):
+        try:
+            logging.info("Starting model initiatiation")
+            Telemetry.set_keys(cycle=None)
+            current_pybamm.state = current_pybamm.initialize_state()
+            # States saved before the metrics index existed get one on first use
+            current_pybamm.save_metrics_index()
+            heartbeat_queue.put((HEARTBEAT_INIT, None, True))
+        except Exception as exception:
+            logging.info(f"Exception found running model initialization {exception}")
+            heartbeat_queue.put((HEARTBEAT_INIT, None, None))
+            return 0
+
+        cycles_to_simulate = get_cycles_to_simulate(current_pybamm, cycle)
+        logging.info(f"Cycles to simulated: {list(cycles_to_simulate)}")
+        for current_cycle in cycles_to_simulate:
+            if current_cycle >= current_pybamm.__len_metrics__() and exceeds_cost_bound(
+                current_pybamm, cost_bound
+            ):
+                censor_run(
+                    current_pybamm, cycle, heartbeat_queue, cost_bound, censored_cost
+                )
+                break
+            logging.info(
+                f"Requested cycle: {cycle} Starting simulation of cycle {current_cycle} -  cicles simulated {current_pybamm.__len_metrics__() - 1}"
+            )
+            Telemetry.set_keys(cycle=current_cycle)
+            try:
+                with Telemetry.stage("cycle"):
+                    result = current_pybamm.run_pybamm(current_cycle, last_cycle=cycle)
+            except Exception as exception:
+                logging.info(f"Exception found running model {exception}")
+                result = MAX_VALUE
+            heartbeat_queue.put((HEARTBEAT_CYCLE, current_cycle, result))
+            if result is None or result == MAX_VALUE:
+                break
+    heartbeat_queue.put((HEARTBEAT_DONE, None, None))
+
+    return 0
+
+
+def censor_run(
+    current_pybamm: PyBammWrapper, cycle, heartbeat_queue, cost_bound, censored_cost
+):
+    """
+    Stops the run requested for cycle after its simulated cycles, sending the
+    censored cost and recording it in the metrics index.
+    """
+    last_cycle = current_pybamm.__len_metrics__() - 1
+    partial_cost = get_partial_cost(current_pybamm)
+    cost = get_censored_cost(partial_cost, cost_bound, censored_cost)
+    logging.info(
+        f"Partial cost {partial_cost} after cycle {last_cycle} exceeds the bound "
+        f"{cost_bound}, reporting {cost}"
+    )
+    current_pybamm.save_censored(
+        cycle,
+        {
+            "after_cycle": last_cycle,
+            "partial_cost": partial_cost,
+            "cost_bound": cost_bound,
+            "censored_cost": censored_cost,
+            "cost": float(cost),
+        },
+    )
+    Telemetry.set_keys(cycle=cycle)
+    Telemetry.record(
+        "censored",
+        0.0,
+        after_cycle=last_cycle,
+        partial_cost=partial_cost,
+        cost_bound=cost_bound,
+        cost=cost,
+    )
+    heartbeat_queue.put((HEARTBEAT_CENSORED, last_cycle, cost))
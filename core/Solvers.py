@@ -0,0 +1,59 @@
+from typing import Callable, Dict, List
+
+import pybamm
+from core.Placement import get_threads
+
+DEFAULT_SOLVER = "casadi_safe"
+
+# Factories building a solver from its absolute and relative tolerances
+_solvers: Dict[str, Callable[[float, float], pybamm.BaseSolver]] = {}
+
+
+def register_solver(name: str):
+    """
+    Decorator registering a solver factory under name, selectable with --solver or
+    the "solver" key of the parameter file.
+    """
+
+    def decorator(factory):
+        _solvers[name] = factory
+        return factory
+
+    return decorator
+
+
+def get_solver_names() -> List[str]:
+    return list(_solvers)
+
+
+def create_solver(name: str, atol: float, rtol: float) -> pybamm.BaseSolver:
+    """
+    Builds the registered solver name with the given tolerances.
+
+    Raises:
+    - ValueError: If no solver is registered under name.
+    """
+    if name not in _solvers:
+        raise ValueError(
+            f"Unknown solver {name}, available: {', '.join(get_solver_names())}"
+        )
+    return _solvers[name](atol, rtol)
+
+
+@register_solver("casadi_safe")
+def casadi_safe(atol: float, rtol: float) -> pybamm.BaseSolver:
+    return pybamm.CasadiSolver(atol=atol, rtol=rtol, mode="safe")
+
+
+@register_solver("casadi_fast_events")
+def casadi_fast_events(atol: float, rtol: float) -> pybamm.BaseSolver:
+    return pybamm.CasadiSolver(atol=atol, rtol=rtol, mode="fast with events")
+
+
+@register_solver("idaklu")
+def idaklu(atol: float, rtol: float) -> pybamm.BaseSolver:
+    if not pybamm.have_idaklu():
+        raise ValueError("The IDAKLU solver is not available in this PyBaMM install")
+    # Uses the threads granted to this evaluation by the placement policy
+    options = {"num_threads": get_threads()}
+    return pybamm.IDAKLUSolver(atol=atol, rtol=rtol, options=options)
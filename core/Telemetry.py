@@ -0,0 +1,114 @@
+import functools
+import json
+import logging
+import os
+import socket
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+TELEMETRY_PATH_ENV = "BMO_TELEMETRY_PATH"
+
+# Directory of the telemetry files and keys (configuration, battery, cycle...) added
+# to every record of this process
+_telemetry_path: Optional[str] = None
+_keys: dict = {}
+
+
+def configure(telemetry_path: Optional[str], **keys):
+    """
+    Enables telemetry for this process. Records are written as JSON lines to a file
+    per host and process in telemetry_path, so parallel evaluations never share one.
+    Telemetry stays disabled while no path is configured.
+    """
+    global _telemetry_path
+    _telemetry_path = telemetry_path or None
+    if _telemetry_path:
+        os.makedirs(_telemetry_path, exist_ok=True)
+    set_keys(**keys)
+
+
+def set_keys(**keys):
+    _keys.update(keys)
+
+
+def enabled() -> bool:
+    return _telemetry_path is not None
+
+
+def get_file_path() -> str:
+    return os.path.join(
+        _telemetry_path, f"telemetry_{socket.gethostname()}_{os.getpid()}.jsonl"
+    )
+
+
+def record(stage_name: str, duration: float, **extra):
+    """
+    Appends a record for a stage that took duration seconds.
+    """
+    if not enabled():
+        return
+    entry = {
+        "time": time.time(),
+        "stage": stage_name,
+        "duration": duration,
+        "pid": os.getpid(),
+        **_keys,
+        **extra,
+    }
+    try:
+        with open(get_file_path(), "a") as file:
+            file.write(json.dumps(entry, default=str) + "\n")
+    except OSError as e:
+        logging.warning(f"Telemetry record could not be written: {e}")
+
+
+@contextmanager
+def stage(stage_name: str, **extra):
+    """
+    Times the enclosed block and records it, flagging it as failed if it raises.
+    """
+    if not enabled():
+        yield
+        return
+    start = time.perf_counter()
+    success = False
+    try:
+        yield
+        success = True
+    finally:
+        record(stage_name, time.perf_counter() - start, success=success, **extra)
+
+
+def timed(stage_name: str):
+    """
+    Decorator recording every call of the function as a stage.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def read_records(telemetry_path: str) -> list:
+    """
+    Reads every record written to telemetry_path, skipping truncated lines left by
+    processes killed while writing.
+    """
+    records = []
+    for file_name in sorted(os.listdir(telemetry_path)):
+        if not file_name.endswith(".jsonl"):
+            continue
+        with open(os.path.join(telemetry_path, file_name), "r") as file:
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
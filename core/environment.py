@@ -0,0 +1,148 @@
+import logging
+import os
+
+from core import Telemetry
+from core.Fidelity import (
+    FIDELITY_LOW,
+    FIDELITY_SPME,
+    get_fidelity_mode,
+    get_fidelity_threshold,
+    get_prescreen_cost,
+    get_prescreen_threshold,
+    get_state_fidelity,
+    lookup_fidelity_metric,
+)
+from core.MetricsIndex import lookup_metric
+from core.paths import (
+    ensure_common_folder_exists,
+    get_log_path,
+    get_parameter_path,
+    get_result_path,
+    get_state_path,
+)
+
+MAX_VALUE = "Inf"
+
+
+def setup_environment(kwargs):
+    """
+    Fetches dataset, battery IDs, and paths from environment variables or kwargs.
+    """
+    dataset_id = kwargs.get("dataset_id")
+    battery_id = kwargs.get("battery_id")
+    dataset_path = os.getenv(kwargs.get("dataset_path"))
+    inputs_path = os.getenv(kwargs.get("inputs_path"))
+    result_path = os.getenv(kwargs.get("result_path"))
+
+    # Create a dictionary to easily map variable names to their values
+    env_vars = {
+        "dataset_path": dataset_path,
+        "inputs_path": inputs_path,
+        "result_path": result_path,
+    }
+
+    # Check each environment variable and collect the names of those that are not set
+    missing_vars = [
+        var_name for var_name, var_value in env_vars.items() if var_value is None
+    ]
+
+    if missing_vars:
+        # Raise an error with the names of the missing environment variables
+        missing_vars_str = ", ".join(
+            missing_vars
+        )  # Join the list of missing variable names into a string
+        raise ValueError(
+            f"Required environment variable(s) not set: {missing_vars_str}"
+        )
+
+    # Ensure common folder exists
+    common_folder_path = ensure_common_folder_exists(
+        inputs_path, dataset_id, battery_id
+    )
+    return common_folder_path, dataset_path, result_path, inputs_path
+
+
+def setup_logging(log_path: str, log_to_file, verbose):
+    """
+    Configures logging based on the verbose flag.
+
+    Handlers are replaced on every call so that long-lived processes (the
+    simulation daemon and its forked request handlers) log each request to
+    the file of the configuration being evaluated.
+    """
+    if log_to_file:
+        logging.basicConfig(
+            filename=log_path,
+            filemode="a",
+            level=logging.INFO,
+            format="%(asctime)s - %(levelname)s - %(message)s",
+            force=True,
+        )
+    else:
+        logging.basicConfig(
+            level=logging.INFO,
+            format="%(asctime)s - %(levelname)s - %(message)s",
+            force=True,
+        )
+
+
+def setup_telemetry(kwargs):
+    """
+    Enables the per-stage telemetry when the environment variable named by the
+    --telemetry_path option is set, keying the records with the evaluation.
+    """
+    Telemetry.configure(
+        os.getenv(kwargs.get("telemetry_path") or Telemetry.TELEMETRY_PATH_ENV),
+        configuration=kwargs.get("id_configuration"),
+        instance=kwargs.get("id_instance"),
+        battery=kwargs.get("battery_id"),
+        requested_cycle=kwargs.get("n_cycle"),
+    )
+
+
+def setup_paths(kwargs):
+    """
+    Constructs paths necessary for the simulation.
+    """
+    common_folder_path, dataset_path, result_path, inputs_path = setup_environment(
+        kwargs
+    )
+    parameter_file_path = get_parameter_path(
+        common_folder_path, id_configuration=kwargs.get("id_configuration")
+    )
+    result_path = get_result_path(
+        common_folder_path, id_configuration=kwargs.get("id_configuration")
+    )
+    state_path = get_state_path(
+        common_folder_path,
+        id_configuration=kwargs.get("id_configuration"),
+        fidelity=get_state_fidelity(get_fidelity_mode(kwargs)),
+    )
+    log_path = get_log_path(
+        common_folder_path, id_configuration=kwargs.get("id_configuration")
+    )
+    return common_folder_path, parameter_file_path, result_path, state_path, log_path
+
+
+def lookup_evaluation_metric(kwargs, cycle):
+    """
+    Looks up an already simulated cycle of the evaluation in the metrics index of its
+    fidelity, see Fidelity.lookup_fidelity_metric. With the SPMe pre-screen enabled,
+    configurations it already rejected are answered with their pre-screen cost.
+    """
+    if get_prescreen_threshold(kwargs) is not None:
+        screen_state_path = setup_paths(dict(kwargs, fidelity=FIDELITY_SPME))[3]
+        simulated, metric = lookup_metric(screen_state_path, cycle)
+        if simulated:
+            cost = get_prescreen_cost(MAX_VALUE if metric is None else metric, kwargs)
+            if cost is not None:
+                return True, None if cost == MAX_VALUE else float(cost)
+    state_path = setup_paths(kwargs)[3]
+    low_state_path = setup_paths(dict(kwargs, fidelity=FIDELITY_LOW))[3]
+    return lookup_fidelity_metric(
+        state_path,
+        low_state_path,
+        cycle,
+        get_fidelity_mode(kwargs),
+        get_fidelity_threshold(kwargs),
+    )
@@ -0,0 +1,117 @@
+import os
+
+
+def get_base_path(battery_id, id_configuration):
+    return f"{battery_id}_{id_configuration}"
+
+
+def ensure_common_folder_exists(input_path, dataset_id, battery_id):
+    """
+    Constructs a common folder path based on input_path, dataset_id, and battery_id,
+    ensures the folder exists, and returns the path.
+
+    Parameters:
+    - input_path: The base path for inputs.
+    - dataset_id: Identifier for the dataset.
+    - battery_id: Identifier for the battery.
+
+    Returns:
+    The path to the common folder.
+    """
+    folder_path = os.path.join(input_path, dataset_id, battery_id)
+    os.makedirs(folder_path, exist_ok=True)
+    return folder_path
+
+
+def get_file_path(common_folder_path, id_configuration, filename):
+    """
+    Attempts to read the parameter file from the common folder.
+
+    Parameters:
+    - common_folder_path: The path to the common folder.
+    - filename: The name of the parameter file.
+    Returns:
+    The contents of the parameter file or None if it couldn't be read.
+    """
+    return os.path.join(common_folder_path, f"{id_configuration}_{filename}")
+
+
+def get_parameter_path(common_folder_path, id_configuration):
+    """
+    Attempts to read the parameter file from the common folder.
+
+    Parameters:
+    - common_folder_path: The path to the common folder.
+    - filename: The name of the parameter file.
+    Returns:
+    The contents of the parameter file or None if it couldn't be read.
+    """
+    return get_file_path(
+        common_folder_path, id_configuration=id_configuration, filename="param.json"
+    )
+
+
+def get_state_path(common_folder_path, id_configuration, fidelity=None):
+    """
+    Attempts to read the parameter file from the common folder.
+
+    Parameters:
+    - common_folder_path: The path to the common folder.
+    - filename: The name of the parameter file.
+    - fidelity: Fidelity suffix of the state, None for high fidelity states.
+    Returns:
+    The contents of the parameter file or None if it couldn't be read.
+    """
+    filename = "state.Wp" if fidelity is None else f"state_{fidelity}.Wp"
+    return get_file_path(
+        common_folder_path, id_configuration=id_configuration, filename=filename
+    )
+
+
+def get_log_path(common_folder_path, id_configuration):
+    """
+    Attempts to read the parameter file from the common folder.
+
+    Parameters:
+    - common_folder_path: The path to the common folder.
+    - filename: The name of the parameter file.
+    Returns:
+    The contents of the parameter file or None if it couldn't be read.
+    """
+    return get_file_path(
+        common_folder_path, id_configuration=id_configuration, filename="info.log"
+    )
+
+
+def get_result_path(common_folder_path, id_configuration):
+    """
+    Attempts to read the parameter file from the common folder.
+
+    Parameters:
+    - common_folder_path: The path to the common folder.
+    - filename: The name of the parameter file.
+    Returns:
+    The contents of the parameter file or None if it couldn't be read.
+    """
+    return get_file_path(
+        common_folder_path, id_configuration=id_configuration, filename="results.Wp"
+    )
+
+
+def get_common_path(inputs_path, dataset_id, battery_id, additional_parts=None):
+    """
+    Constructs a common path used throughout the system.
+
+    Parameters:
+    - inputs_path: Base input path.
+    - dataset_id: ID of the dataset.
+    - battery_id: ID of the battery.
+    - additional_parts: List of additional path parts or None.
+
+    Returns:
+    A string representing the constructed path.
+    """
+    parts = [inputs_path, dataset_id, battery_id]
+    if additional_parts:
+        parts.extend(additional_parts)
+    return os.path.join(*parts)
@@ -1,32 +1,29 @@
 import json
 import os
 from dataclasses import dataclass
+from typing import List
 
 import numpy as np
 import pandas as pd
 import pybamm
-
-
-def get_base_path(battery_id, id_configuration):
-    return f"{battery_id}_{id_configuration}"
-
-
-def ensure_common_folder_exists(input_path, dataset_id, battery_id):
-    """
-    Constructs a common folder path based on input_path, dataset_id, and battery_id,
-    ensures the folder exists, and returns the path.
-
-    Parameters:
-    - input_path: The base path for inputs.
-    - dataset_id: Identifier for the dataset.
-    - battery_id: Identifier for the battery.
-
-    Returns:
-    The path to the common folder.
-    """
-    folder_path = os.path.join(input_path, dataset_id, battery_id)
-    os.makedirs(folder_path, exist_ok=True)
-    return folder_path
+from core.paths import (
+    ensure_common_folder_exists,
+    get_base_path,
+    get_common_path,
+    get_file_path,
+    get_log_path,
+    get_parameter_path,
+    get_result_path,
+    get_state_path,
+)
+
+# Only variables processed from the solutions, see PybammOutput
+OUTPUT_VARIABLES = [
+    "Time [h]",
+    "Current [A]",
+    "Battery voltage [V]",
+    "Discharge capacity [A.h]",
+]
 
 
 def read_json_file(file_path):
@@ -49,79 +46,6 @@ def read_json_file(file_path):
     return None
 
 
-def get_file_path(common_folder_path, id_configuration, filename):
-    """
-    Attempts to read the parameter file from the common folder.
-
-    Parameters:
-    - common_folder_path: The path to the common folder.
-    - filename: The name of the parameter file.
-    Returns:
-    The contents of the parameter file or None if it couldn't be read.
-    """
-    return os.path.join(common_folder_path, f"{id_configuration}_{filename}")
-
-
-def get_parameter_path(common_folder_path, id_configuration):
-    """
-    Attempts to read the parameter file from the common folder.
-
-    Parameters:
-    - common_folder_path: The path to the common folder.
-    - filename: The name of the parameter file.
-    Returns:
-    The contents of the parameter file or None if it couldn't be read.
-    """
-    return get_file_path(
-        common_folder_path, id_configuration=id_configuration, filename="param.json"
-    )
-
-
-def get_state_path(common_folder_path, id_configuration):
-    """
-    Attempts to read the parameter file from the common folder.
-
-    Parameters:
-    - common_folder_path: The path to the common folder.
-    - filename: The name of the parameter file.
-    Returns:
-    The contents of the parameter file or None if it couldn't be read.
-    """
-    return get_file_path(
-        common_folder_path, id_configuration=id_configuration, filename="state.Wp"
-    )
-
-
-def get_log_path(common_folder_path, id_configuration):
-    """
-    Attempts to read the parameter file from the common folder.
-
-    Parameters:
-    - common_folder_path: The path to the common folder.
-    - filename: The name of the parameter file.
-    Returns:
-    The contents of the parameter file or None if it couldn't be read.
-    """
-    return get_file_path(
-        common_folder_path, id_configuration=id_configuration, filename="info.log"
-    )
-
-
-def get_result_path(common_folder_path, id_configuration):
-    """
-    Attempts to read the parameter file from the common folder.
-
-    Parameters:
-    - common_folder_path: The path to the common folder.
-    - filename: The name of the parameter file.
-    Returns:
-    The contents of the parameter file or None if it couldn't be read.
-    """
-    return get_file_path(
-        common_folder_path, id_configuration=id_configuration, filename="results.Wp"
-    )
-
-
 def save_to_json_file(data, file_path):
     """
     Saves the given data to a JSON file at the specified path.
@@ -151,37 +75,20 @@ def save_parameter_file(common_folder_path, data, filename="param.json"):
     save_to_json_file(data, param_file_path)
 
 
-def get_common_path(inputs_path, dataset_id, battery_id, additional_parts=None):
-    """
-    Constructs a common path used throughout the system.
-
-    Parameters:
-    - inputs_path: Base input path.
-    - dataset_id: ID of the dataset.
-    - battery_id: ID of the battery.
-    - additional_parts: List of additional path parts or None.
-
-    Returns:
-    A string representing the constructed path.
-    """
-    parts = [inputs_path, dataset_id, battery_id]
-    if additional_parts:
-        parts.extend(additional_parts)
-    return os.path.join(*parts)
-
-
 @dataclass
 class PybammOutput:
     df: pd.DataFrame
 
     def __init__(self, solution: pybamm.Solution):
-        relative_time = solution["Time [h]"].entries - np.min(
-            solution["Time [h]"].entries
-        )
-        C = solution["Current [A]"].entries
-        V = solution["Battery voltage [V]"].entries
-        Dis = solution["Discharge capacity [A.h]"].entries
-        data = solution.get_data_dict(None)
+        self.df = self.get_dataframe(solution).drop(columns="Cycle")
+
+    @staticmethod
+    def get_dataframe(solution: pybamm.Solution) -> pd.DataFrame:
+        data = solution.get_data_dict(OUTPUT_VARIABLES)
+        relative_time = data["Time [h]"] - np.min(data["Time [h]"])
+        C = data["Current [A]"]
+        V = data["Battery voltage [V]"]
+        Dis = data["Discharge capacity [A.h]"]
         Cycle = data["Cycle"]
         Step = data["Step"][-len(Cycle) :]
 
@@ -189,12 +96,40 @@ class PybammOutput:
         cycle_relative_time = relative_time - np.min(relative_time)
 
         # Create a dataframe for the current cycle
-        self.df = pd.DataFrame(
+        return pd.DataFrame(
             {
                 "relative_time": cycle_relative_time,
                 "C": C,
                 "Dis": Dis,
                 "V": V,
                 "Step": Step,
+                "Cycle": Cycle,
             }
         )
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "PybammOutput":
+        output = cls.__new__(cls)
+        output.df = df
+        return output
+
+    @classmethod
+    def split_cycles(cls, solution: pybamm.Solution, n_cycles: int) -> List["PybammOutput"]:
+        """
+        Splits the solution of an experiment of n_cycles cycles into one output per
+        cycle, as if every cycle had been solved on its own from the last state of
+        the previous one: each output starts with that state, as step 0.
+        """
+        df = cls.get_dataframe(solution)
+        # The cycles before these belong to the starting solution of the solve
+        first_cycle = int(df["Cycle"].max()) - n_cycles + 1
+        outputs = []
+        df_cycle = df[df["Cycle"] <= first_cycle]
+        for cycle in range(first_cycle, first_cycle + n_cycles):
+            if cycle > first_cycle:
+                start = df_cycle.iloc[[-1]].assign(Step=0)
+                df_cycle = pd.concat([start, df[df["Cycle"] == cycle]])
+            df_output = df_cycle.drop(columns="Cycle").reset_index(drop=True)
+            df_output["relative_time"] -= df_output["relative_time"].min()
+            outputs.append(cls.from_dataframe(df_output))
+        return outputs
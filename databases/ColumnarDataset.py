@@ -0,0 +1,248 @@
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+import h5py
+import numpy as np
+import pandas as pd
+
+CYCLE_COLUMNS = ["C_cap", "relative_time", "Step", "C", "V"]
+CAPACITY_TEST_COLUMNS = ["Cap", "T", "C", "V"]
+CYCLE_TABLE = "cycles"
+CAPACITY_TEST_TABLE = "capacity_tests"
+# Segment step of the tables without a Step column, one segment per cycle
+NO_STEP = -1
+LAYOUT_VERSION = 2
+
+_GROUP_KEY = re.compile(r"^(CapTest_)?(\w+)_Cycle(\d+)$")
+
+
+@dataclass
+class ColumnarTable:
+    """
+    Cycles of one battery stored as contiguous column arrays, with a CSR-style
+    offsets table: the rows of segment i, one (cycle, step) pair, are
+    offsets[i]:offsets[i + 1]. Segments are sorted by cycle and step, and the rows
+    keep their order in the dataset, so the rows of a cycle are contiguous too.
+    Columns are memory-mapped, so slices are views.
+
+    Attributes:
+        path (str): Folder of the table.
+        columns (Dict[str, np.ndarray]): Column arrays by name.
+        segments (np.ndarray): (cycle, step) of every segment.
+        offsets (np.ndarray): First row of every segment, and the row count last.
+    """
+
+    path: str
+    columns: Dict[str, np.ndarray] = field(default_factory=dict)
+    segments: np.ndarray = field(default_factory=lambda: np.empty((0, 2), int))
+    offsets: np.ndarray = field(default_factory=lambda: np.zeros(1, int))
+    _segment_index: Dict[Tuple[int, int], int] = field(
+        init=False, default_factory=dict
+    )
+    _cycle_index: Dict[int, Tuple[int, int]] = field(init=False, default_factory=dict)
+
+    def __post_init__(self):
+        for index, (cycle, step) in enumerate(self.segments.tolist()):
+            self._segment_index[(cycle, step)] = index
+            first, _ = self._cycle_index.get(cycle, (index, index))
+            self._cycle_index[cycle] = (first, index + 1)
+
+    @classmethod
+    def open(cls, path: str, mmap_mode: Optional[str] = "r") -> "ColumnarTable":
+        """
+        Raises:
+        - ValueError: If the table was written with another layout version.
+        """
+        with open(os.path.join(path, "columns.json"), "r") as file:
+            header = json.load(file)
+        if header.get("version") != LAYOUT_VERSION:
+            raise ValueError(
+                f"Table {path} has layout version {header.get('version')}, "
+                f"expected {LAYOUT_VERSION}: convert the dataset again"
+            )
+        names = header["columns"]
+        return cls(
+            path=path,
+            columns={
+                name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+                for name in names
+            },
+            segments=np.load(os.path.join(path, "segments.npy")),
+            offsets=np.load(os.path.join(path, "offsets.npy")),
+        )
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        for name, values in self.columns.items():
+            np.save(os.path.join(self.path, f"{name}.npy"), values)
+        np.save(os.path.join(self.path, "segments.npy"), self.segments)
+        np.save(os.path.join(self.path, "offsets.npy"), self.offsets)
+        with open(os.path.join(self.path, "columns.json"), "w") as file:
+            json.dump({"columns": list(self.columns), "version": LAYOUT_VERSION}, file)
+
+    def cycles(self) -> Set[int]:
+        return set(self._cycle_index)
+
+    def get_rows(self, cycle: int, step: Optional[int] = None) -> Optional[slice]:
+        """
+        Rows of a cycle, or of one of its steps, or None if they are not stored.
+        """
+        if step is None:
+            if cycle not in self._cycle_index:
+                return None
+            first, last = self._cycle_index[cycle]
+        else:
+            if (cycle, step) not in self._segment_index:
+                return None
+            first = self._segment_index[(cycle, step)]
+            last = first + 1
+        return slice(int(self.offsets[first]), int(self.offsets[last]))
+
+    def get_columns(
+        self, cycle: int, step: Optional[int] = None
+    ) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Zero-copy views of the columns of a cycle, or of one of its steps.
+        """
+        rows = self.get_rows(cycle, step)
+        if rows is None:
+            return None
+        return {name: values[rows] for name, values in self.columns.items()}
+
+
+def build_table(
+    path: str,
+    cycles: List[Tuple[int, Dict[str, np.ndarray]]],
+    step_column: Optional[str],
+) -> ColumnarTable:
+    """
+    Builds a table from the columns of every cycle, keeping the order of their
+    rows. A cycle whose steps decrease somewhere, such as one repeating a step
+    after another, has no contiguous segment per step, so it is left out with a
+    warning and read from the dataset instead.
+    """
+    columns = {name: [] for name in (cycles[0][1] if cycles else {})}
+    segments, counts = [], []
+    for cycle, values in sorted(cycles, key=lambda item: item[0]):
+        if step_column is None:
+            steps = np.full(len(next(iter(values.values()))), NO_STEP)
+        else:
+            steps = values[step_column]
+        if np.any(np.diff(steps) < 0):
+            logging.warning(
+                f"Cycle {cycle} of {path} not converted: its steps are not sorted"
+            )
+            continue
+        for name in columns:
+            columns[name].append(values[name])
+        unique_steps, step_counts = np.unique(steps, return_counts=True)
+        segments += [(cycle, int(step)) for step in unique_steps]
+        counts += step_counts.tolist()
+    return ColumnarTable(
+        path=path,
+        columns={
+            name: np.concatenate(parts) if parts else np.empty(0)
+            for name, parts in columns.items()
+        },
+        segments=np.array(segments, dtype=np.int64).reshape(-1, 2),
+        offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+    )
+
+
+def convert(
+    dataset_path: str, columnar_path: str, batteries: Optional[List[str]] = None
+) -> List[str]:
+    """
+    Converts the per-group layout of an HDF5 dataset, one <battery>_CycleNNNN and
+    CapTest_<battery>_CycleNNNN group per cycle, to a columnar store with the
+    cycles and capacity tests tables of every battery.
+
+    Returns:
+    - List[str]: The converted batteries.
+    """
+    groups: Dict[Tuple[str, bool], List[Tuple[int, Dict[str, np.ndarray]]]] = {}
+    with h5py.File(dataset_path, "r") as file:
+        for key in file.keys():
+            match = _GROUP_KEY.match(key)
+            if match is None:
+                continue
+            is_capacity_test, battery, cycle = match.groups()
+            if batteries is not None and battery not in batteries:
+                continue
+            names = CAPACITY_TEST_COLUMNS if is_capacity_test else CYCLE_COLUMNS
+            if any(name not in file[key] for name in names):
+                logging.warning(f"Group {key} not converted: missing columns")
+                continue
+            values = {name: np.ravel(file[key][name][:]) for name in names}
+            groups.setdefault((battery, bool(is_capacity_test)), []).append(
+                (int(cycle), values)
+            )
+    for (battery, is_capacity_test), cycles in groups.items():
+        table = CAPACITY_TEST_TABLE if is_capacity_test else CYCLE_TABLE
+        step_column = None if is_capacity_test else "Step"
+        build_table(
+            os.path.join(columnar_path, battery, table), cycles, step_column
+        ).save()
+        logging.info(f"{len(cycles)} {table} of {battery} converted")
+    return sorted({battery for battery, _ in groups})
+
+
+@dataclass
+class ColumnarDataset:
+    """
+    Reader of a columnar store built by convert, a drop-in source of the
+    experimental data of DatasetEV. Tables are opened memory-mapped on first use.
+    Missing tables, and tables of another layout version, read as None.
+    """
+
+    path: str
+    _tables: Dict[Tuple[str, str], Optional[ColumnarTable]] = field(
+        init=False, default_factory=dict
+    )
+
+    def get_table(self, battery: str, table: str) -> Optional[ColumnarTable]:
+        key = (battery, table)
+        if key not in self._tables:
+            table_path = os.path.join(self.path, battery, table)
+            self._tables[key] = None
+            if os.path.isdir(table_path):
+                try:
+                    self._tables[key] = ColumnarTable.open(table_path)
+                except ValueError as e:
+                    logging.warning(str(e))
+        return self._tables[key]
+
+    def get_df_cycle(self, battery: str, cycle: int) -> Optional[pd.DataFrame]:
+        table = self.get_table(battery, CYCLE_TABLE)
+        columns = None if table is None else table.get_columns(cycle)
+        if columns is None:
+            return None
+        columns["Cap"] = columns.pop("C_cap")
+        names = ["Cap", "relative_time", "Step", "C", "V"]
+        return pd.DataFrame({name: columns[name] for name in names}, copy=False)
+
+    def get_df_capacity_test(
+        self, battery: str, cycle: int
+    ) -> Optional[pd.DataFrame]:
+        table = self.get_table(battery, CAPACITY_TEST_TABLE)
+        columns = None if table is None else table.get_columns(cycle)
+        if columns is None:
+            return None
+        return pd.DataFrame(columns, copy=False)
+
+    def get_capacity_test_cycles(self, battery: str) -> Optional[Set[int]]:
+        table = self.get_table(battery, CAPACITY_TEST_TABLE)
+        return None if table is None else table.cycles()
+
+
+@lru_cache(maxsize=None)
+def open_columnar_dataset(path: str) -> ColumnarDataset:
+    """
+    Reader of the columnar store at path, shared by every dataset of the process.
+    """
+    return ColumnarDataset(os.path.abspath(path))
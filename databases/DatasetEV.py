@@ -1,8 +1,12 @@
+import copy
+import hashlib
 import logging
 import os
+from collections import OrderedDict
 from dataclasses import dataclass
+from functools import lru_cache
 from enum import Enum
-from typing import Dict, Optional, Tuple
+from typing import Dict, Optional, Set, Tuple
 
 import h5py
 import matplotlib.pyplot as plt
@@ -10,6 +14,10 @@ import numpy as np
 import pandas as pd
 import pybamm
 from core.DatasetBase import AbstractBaseDataset, Experiments, SoC_termination
+from databases.ColumnarDataset import open_columnar_dataset
+from core.DriveCycle import DriveCycle
+from core.SimulationCache import SimulationCache, canonical_hash
+from core.Telemetry import timed
 from core.utils import PybammOutput
 from scipy.integrate import trapz
 from scipy.interpolate import interp1d
@@ -18,6 +26,29 @@ from scipy.optimize import curve_fit
 rsquared_thresshold = 0.6
 TO_PLOT = False
 MAX_METRIC_VALUE = 10
+# Steps and variables compared by the RMSE metric
+RMSE_STEP_VARS = [(1, "C"), (2, "V"), (3, "C"), (4, "V")]
+RMSE_INTERP_POINTS = 100
+# Drive cycle read from the working directory when no path is given
+DEFAULT_DRIVE_CYCLE_PATH = "udds_current.csv"
+# Repetitions of the drive cycle in the main experiment
+N_UDDS = 40
+# Bump whenever define_experiment changes, to invalidate the cached experiments
+EXPERIMENTS_VERSION = "1"
+
+EXPERIMENTAL_CACHE_SIZE_ENV = "BMO_EXPERIMENTAL_CACHE_SIZE"
+# Experimental cycles kept in memory by default, 0 disables the cache
+EXPERIMENTAL_CACHE_SIZE = 32
+CYCLE_KIND = "cycle"
+CAPACITY_TEST_KIND = "capacity_test"
+
+# Experiments defined in this process by key, see DatasetEV.setup_experiment
+_experiments: Dict[str, Experiments] = {}
+# Experimental data read in this process by (dataset, battery, cycle, kind), shared
+# by every metric and cycle, the least recently used being evicted first
+_experimental_cycles: "OrderedDict[Tuple[str, str, int, str], pd.DataFrame]" = (
+    OrderedDict()
+)
 
 
 @dataclass
@@ -39,10 +70,80 @@ class BatteryIDEV(Enum):
     V05 = 10
 
 
+@lru_cache(maxsize=None)
+def _get_file_hash(path: str, mtime_ns: int, size: int) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def get_file_hash(path: str) -> str:
+    """
+    Hashes the content of a file, read again only when it changes.
+    """
+    stat = os.stat(path)
+    return _get_file_hash(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
 class DatasetEV(AbstractBaseDataset):
+    capacity_test_cycles: Optional[Set[int]] = None
+
+    def __init__(
+        self,
+        results_path,
+        dataset_path,
+        instance_id,
+        battery_id,
+        drive_cycle_path: Optional[str] = None,
+        drive_cycle: Optional[DriveCycle] = None,
+        cache_path: Optional[str] = None,
+        columnar_path: Optional[str] = None,
+    ):
+        super().__init__(results_path, dataset_path, instance_id, battery_id)
+        if not drive_cycle_path:
+            logging.warning(
+                f"No drive cycle path given, reading {DEFAULT_DRIVE_CYCLE_PATH} from "
+                "the working directory"
+            )
+        self.drive_cycle_path = os.path.abspath(
+            drive_cycle_path or DEFAULT_DRIVE_CYCLE_PATH
+        )
+        self.drive_cycle = drive_cycle or DriveCycle()
+        self.cache_path = cache_path
+        # Columnar copy of the dataset, read instead of its HDF5 groups
+        self.columnar = open_columnar_dataset(columnar_path) if columnar_path else None
+
     def setup_experiment(self):
-        # Implementation specific to Experiment1
-        return self.define_experiment()
+        """
+        Returns the experiments of the battery, defined once per process for its
+        charge string and drive cycle and also stored in the cache path, if given.
+        Every call gets its own copy, as building a simulation mutates the steps.
+        """
+        key = self.get_experiments_key()
+        experiments = _experiments.get(key)
+        if experiments is None:
+            cache = (
+                SimulationCache(self.cache_path, namespace="experiments")
+                if self.cache_path
+                else None
+            )
+            experiments = cache.read_experiments(key) if cache else None
+            if experiments is None:
+                experiments = self.define_experiment()
+                if cache:
+                    cache.save_experiments(key, experiments)
+            _experiments[key] = experiments
+        return copy.deepcopy(experiments)
+
+    def get_experiments_key(self) -> str:
+        return canonical_hash(
+            {
+                "charge": self.get_charge_string(),
+                "drive_cycle": get_file_hash(self.drive_cycle_path),
+                "drive_cycle_representation": self.drive_cycle.to_dict(),
+                "n_udds": N_UDDS,
+                "version": EXPERIMENTS_VERSION,
+            }
+        )
 
     def run(self):
         # Implementation specific to Experiment1
@@ -104,12 +205,7 @@ class DatasetEV(AbstractBaseDataset):
                 "Discharge at 0.5C until 3.5 V",
             ]
         )
-        n_ussd = 40
-        df_alt_current_profile = pd.read_csv("udds_current.csv")
-        df_alt_current_profile = pd.concat(
-            [df_alt_current_profile] * n_ussd, ignore_index=True
-        )
-
+        df_alt_current_profile = pd.read_csv(self.drive_cycle_path)
         udds_current_profile = np.column_stack(
             [df_alt_current_profile.index, -df_alt_current_profile.C]
         )
@@ -121,8 +217,8 @@ class DatasetEV(AbstractBaseDataset):
                     "Charge at C/4 until 4.2 V",
                     "Hold at 4.2 V until 50 mA",
                     pybamm.step.c_rate(0.25, termination=SoC_termination(0.8)),
-                    pybamm.step.current(
-                        udds_current_profile, termination=SoC_termination(0.2)
+                    self.drive_cycle.get_step(
+                        udds_current_profile, N_UDDS, termination=SoC_termination(0.2)
                     ),
                 )
             ]
@@ -190,6 +286,19 @@ class DatasetEV(AbstractBaseDataset):
             cycle_data.to_hdf(self.results_path, key=key, mode="a")
 
     def get_df_capacity_test(self, cycle_number: int) -> Optional[pd.DataFrame]:
+        return self.get_cached_df(
+            cycle_number, CAPACITY_TEST_KIND, self.read_df_capacity_test
+        )
+
+    def read_df_capacity_test(self, cycle_number: int) -> Optional[pd.DataFrame]:
+        if self.columnar is not None:
+            df = self.columnar.get_df_capacity_test(self.battery_id.name, cycle_number)
+            if df is not None:
+                return df
+            logging.info(
+                f"Capacity test of cycle {cycle_number} not in the columnar store, "
+                f"reading {self.dataset_path}"
+            )
         if not os.path.exists(self.dataset_path):
             logging.error(f"File {self.dataset_path} does not exist.")
             return None
@@ -224,7 +333,82 @@ class DatasetEV(AbstractBaseDataset):
 
         return None
 
+    def get_capacity_test_cycles(self) -> Optional[Set[int]]:
+        """
+        Availability index of the capacity tests of the battery, built from the
+        CapTest_<battery>_CycleNNNN keys of the dataset the first time it is needed.
+        """
+        if self.capacity_test_cycles is not None:
+            return self.capacity_test_cycles
+        if self.columnar is not None:
+            self.capacity_test_cycles = self.columnar.get_capacity_test_cycles(
+                self.battery_id.name
+            )
+            if self.capacity_test_cycles is not None:
+                return self.capacity_test_cycles
+            logging.warning(
+                f"Capacity tests of {self.battery_id.name} not in the columnar store, "
+                f"indexing {self.dataset_path}"
+            )
+        if not os.path.exists(self.dataset_path):
+            logging.error(f"File {self.dataset_path} does not exist.")
+            return None
+
+        prefix = f"CapTest_{self.battery_id.name}_Cycle"
+        try:
+            with h5py.File(self.dataset_path, "r") as file:
+                self.capacity_test_cycles = {
+                    int(key[len(prefix) :])
+                    for key in file.keys()
+                    if key.startswith(prefix)
+                }
+        except Exception as e:
+            logging.error(f"Capacity tests of {self.dataset_path} not indexed: {e}")
+            return None
+        logging.info(f"Capacity tests found on cycles {sorted(self.capacity_test_cycles)}")
+        return self.capacity_test_cycles
+
+    def warm_up(self, cycles: int):
+        """
+        Reads the experimental cycles and capacity tests of cycles 0 to cycles into
+        the in-process cache, so processes forked afterwards inherit them.
+        """
+        for cycle_number in range(cycles + 1):
+            self.get_df_experimental(cycle_number)
+            self.get_df_capacity_test(cycle_number)
+
     def get_df_experimental(self, cycle_number: int) -> Optional[pd.DataFrame]:
+        """
+        Returns the DataFrame of a specific cycle, read from the HDF5 file the first
+        time it is needed in this process.
+        """
+        return self.get_cached_df(cycle_number, CYCLE_KIND, self.read_df_experimental)
+
+    def get_cached_df(
+        self, cycle_number: int, kind: str, read
+    ) -> Optional[pd.DataFrame]:
+        """
+        Returns the experimental data of a cycle from the in-process cache, reading it
+        with read on a miss. Each caller gets a shallow copy, so adding or replacing
+        columns leaves the cached DataFrame untouched. Missing data is not cached.
+
+        The cache holds BMO_EXPERIMENTAL_CACHE_SIZE DataFrames, 32 by default.
+        """
+        size = int(os.getenv(EXPERIMENTAL_CACHE_SIZE_ENV, EXPERIMENTAL_CACHE_SIZE))
+        key = (self.dataset_path, self.battery_id.name, cycle_number, kind)
+        df = _experimental_cycles.get(key)
+        if df is not None:
+            _experimental_cycles.move_to_end(key)
+            return df.copy(deep=False)
+        df = read(cycle_number)
+        if df is None or size <= 0:
+            return df
+        _experimental_cycles[key] = df
+        while len(_experimental_cycles) > size:
+            _experimental_cycles.popitem(last=False)
+        return df.copy(deep=False)
+
+    def read_df_experimental(self, cycle_number: int) -> Optional[pd.DataFrame]:
         """
         Reads and returns the DataFrame of a specific cycle from an HDF5 file.
 
@@ -236,6 +420,14 @@ class DatasetEV(AbstractBaseDataset):
         Returns:
         - A pandas DataFrame containing the data for the specified cycle, or None if the file or cycle data does not exist.
         """
+        if self.columnar is not None:
+            df = self.columnar.get_df_cycle(self.battery_id.name, cycle_number)
+            if df is not None:
+                return df
+            logging.warning(
+                f"Cycle {cycle_number} not in the columnar store, "
+                f"reading {self.dataset_path}"
+            )
 
         if not os.path.exists(self.dataset_path):
             logging.error(f"File {self.dataset_path} does not exist.")
@@ -270,6 +462,7 @@ class DatasetEV(AbstractBaseDataset):
 
         return None
 
+    @timed("metric_total_capacity")
     def __metric_total_capacity__(self, n_cycle, output):
         df_exp = self.get_df_capacity_test(n_cycle)
         if df_exp is None:
@@ -306,6 +499,7 @@ class DatasetEV(AbstractBaseDataset):
         )
         return calc_rmse, cap_real
 
+    @timed("metric_discharge_capacity")
     def __metric_discharge_capacity__(self, n_cycle, output) -> float:
         df_exp = self.get_df_experimental(n_cycle)
         if df_exp is None:
@@ -322,6 +516,7 @@ class DatasetEV(AbstractBaseDataset):
         logging.info(f"Capacity sim {sim_cap} - exp {exp_cap}")
         return np.sqrt((sim_cap - exp_cap) ** 2)
 
+    @timed("metric_linear")
     def __metric_linear__(self, cycle_number: int, output: PybammOutput) -> float:
         df_experimental = self.get_df_experimental(cycle_number)
         df_simulated = output.df
@@ -330,15 +525,15 @@ class DatasetEV(AbstractBaseDataset):
         )
         return linear_metric
 
+    @timed("metric_rmse")
     def __metric_rmse__(self, cycle_number, output) -> float:
         df_experimental = self.get_df_experimental(cycle_number)
         df_simulated = output.df
         if df_experimental is None or df_simulated is None:
             return MAX_METRIC_VALUE
         correct_results = 0
-        step_vars = [(1, "C"), (2, "V"), (3, "C"), (4, "V")]
         results = 0.0
-        for index, var in step_vars:
+        for index, var in RMSE_STEP_VARS:
             result = calc_error_non_degradation(
                 df_experimental, df_simulated, index, var
             )
@@ -351,6 +546,28 @@ class DatasetEV(AbstractBaseDataset):
         else:
             return results / correct_results
 
+    def get_residuals_non_degradation(
+        self, output: PybammOutput, n_cycle
+    ) -> Optional[np.ndarray]:
+        """
+        Residuals of the segments compared by the RMSE metric, concatenated. Segments
+        that can't be compared are filled with MAX_METRIC_VALUE, so the vector keeps
+        its size between simulations.
+        """
+        df_experimental = self.get_df_experimental(n_cycle)
+        if df_experimental is None or output.df is None:
+            return None
+        residuals = []
+        for index, var in RMSE_STEP_VARS:
+            result = get_residuals_step(
+                df_experimental, output.df, index, var, RMSE_INTERP_POINTS
+            )
+            if result is None or not np.all(np.isfinite(result)):
+                result = np.full(RMSE_INTERP_POINTS, MAX_METRIC_VALUE, dtype=float)
+            residuals.append(result)
+        return np.concatenate(residuals)
+
+    @timed("metric_integral")
     def __metric_integral__(self, cycle_number, output) -> float:
         df_experimental = self.get_df_experimental(cycle_number)
         df_simulated = output.df
@@ -473,27 +690,27 @@ def fit_udds_profile_linear(df, to_plot=TO_PLOT):
     return result_fit
 
 
-def calc_error_non_degradation(
+def interpolate_step(
     df_experimental: pd.DataFrame,
     df_simulated: pd.DataFrame,
     step: int,
     var: str,
-    to_plot: bool = TO_PLOT,
     interp_points: int = 100,
-) -> Optional[float]:
+) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
     """
-    Calculate the RMSE error between electric vehicle data and PyBamm simulation data, or return None if data is insufficient.
+    Interpolate the experimental and simulated curves of a variable over the time both
+    cover in a step, or return None if data is insufficient.
 
     Parameters:
     - df_experimental: DataFrame containing the experimental data.
     - df_simulated: DataFrame containing the PyBamm simulation data.
     - step: Specific step for analysis.
     - var: Variable to analyze ('C' or 'V').
-    - to_plot: If True, plots the curves of EV and PB data.
     - interp_points: Number of points for interpolation.
 
     Returns:
-    - Normalized RMSE for the specified variable across the given step, or None if data is insufficient.
+    - The common relative time and the experimental and simulated values over it, or
+      None if data is insufficient.
     """
 
     # Check if DataFrames are empty or do not contain the specified step
@@ -528,8 +745,6 @@ def calc_error_non_degradation(
         df_sim["relative_time"] - df_sim["relative_time"].min()
     )
 
-    # Range to normalize the significance of each segment
-    range_min = min(df_sim[var].min(), df_exp[var].min())
     # Common time range between the two curves
     min_time = max(df_sim["relative_time"].min(), df_exp["relative_time"].min())
     max_time = min(df_sim["relative_time"].max(), df_exp["relative_time"].max())
@@ -553,18 +768,67 @@ def calc_error_non_degradation(
         bounds_error=False,
         fill_value="extrapolate",
     )
-    var_intrp_exp = interp_EV(trunc_time)
-    var_intrp_sim = interp_PB(trunc_time)
+    return trunc_time, interp_EV(trunc_time), interp_PB(trunc_time)
+
+
+def get_residuals_step(
+    df_experimental: pd.DataFrame,
+    df_simulated: pd.DataFrame,
+    step: int,
+    var: str,
+    interp_points: int = 100,
+) -> Optional[np.ndarray]:
+    """
+    Residuals between the simulated and experimental magnitudes of a variable over a
+    step, normalized by the mean experimental value. Their root mean square is the
+    error of calc_error_non_degradation.
 
+    Returns:
+    - The interp_points residuals, or None if data is insufficient.
+    """
+    curves = interpolate_step(df_experimental, df_simulated, step, var, interp_points)
+    if curves is None:
+        return None
+    _, var_intrp_exp, var_intrp_sim = curves
     value_range = np.abs(np.mean(var_intrp_exp))
-    # Calculate RMSE error
-    calc_rmse = (
-        np.sqrt(np.mean((np.abs(var_intrp_sim) - np.abs(var_intrp_exp)) ** 2))
-        / value_range
+    return (np.abs(var_intrp_sim) - np.abs(var_intrp_exp)) / value_range
+
+
+def calc_error_non_degradation(
+    df_experimental: pd.DataFrame,
+    df_simulated: pd.DataFrame,
+    step: int,
+    var: str,
+    to_plot: bool = TO_PLOT,
+    interp_points: int = 100,
+) -> Optional[float]:
+    """
+    Calculate the RMSE error between electric vehicle data and PyBamm simulation data, or return None if data is insufficient.
+
+    Parameters:
+    - df_experimental: DataFrame containing the experimental data.
+    - df_simulated: DataFrame containing the PyBamm simulation data.
+    - step: Specific step for analysis.
+    - var: Variable to analyze ('C' or 'V').
+    - to_plot: If True, plots the curves of EV and PB data.
+    - interp_points: Number of points for interpolation.
+
+    Returns:
+    - Normalized RMSE for the specified variable across the given step, or None if data is insufficient.
+    """
+    residuals = get_residuals_step(
+        df_experimental, df_simulated, step, var, interp_points
     )
+    if residuals is None:
+        return None
+    # Calculate RMSE error
+    calc_rmse = np.sqrt(np.mean(residuals**2))
 
     # Optional: plot the curves
     if to_plot:
+        trunc_time, var_intrp_exp, var_intrp_sim = interpolate_step(
+            df_experimental, df_simulated, step, var, interp_points
+        )
         plt.figure(figsize=(10, 6))
         plt.plot(trunc_time, var_intrp_exp, label="Experimental Data")
         plt.plot(trunc_time, var_intrp_sim, label="Simulated Data")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import logging
+import sys
+import time
+
+import click
+import numpy as np
+from databases.ColumnarDataset import CYCLE_TABLE, ColumnarDataset, convert
+from databases.DatasetEV import DatasetEV
+
+
+def time_reads(read, cycles, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for cycle in cycles:
+            read(cycle)
+    return (time.perf_counter() - start) / (repeat * max(len(cycles), 1))
+
+
+def check_battery(dataset_path, columnar_path, battery, repeat):
+    """
+    Checks that the columnar store returns the data of the HDF5 groups, and times
+    the read of a cycle and the selection of one of its steps in both layouts.
+    """
+    dataset = DatasetEV(
+        results_path=None,
+        dataset_path=dataset_path,
+        instance_id=None,
+        battery_id=DatasetEV.get_battery_by_name(battery),
+    )
+    columnar = ColumnarDataset(columnar_path)
+    table = columnar.get_table(battery, CYCLE_TABLE)
+    cycles = sorted(table.cycles())
+    mismatches = 0
+    for cycle in cycles:
+        df_h5 = dataset.read_df_experimental(cycle)
+        df_columnar = columnar.get_df_cycle(battery, cycle)
+        if df_h5.shape != df_columnar.shape or not np.allclose(
+            df_h5.to_numpy(), df_columnar.to_numpy(), equal_nan=True
+        ):
+            mismatches += 1
+    df = columnar.get_df_cycle(battery, cycles[0])
+    step = int(df["Step"].iloc[-1])
+    return {
+        "battery": battery,
+        "cycles": len(cycles),
+        "mismatches": mismatches,
+        "h5_ms": 1e3 * time_reads(dataset.read_df_experimental, cycles, repeat),
+        "columnar_ms": 1e3
+        * time_reads(lambda c: columnar.get_df_cycle(battery, c), cycles, repeat),
+        "mask_us": 1e6
+        * time_reads(lambda _: df[df["Step"] == step], range(100), repeat),
+        "slice_us": 1e6
+        * time_reads(lambda _: table.get_columns(cycles[0], step), range(100), repeat),
+    }
+
+
+@click.command()
+@click.option("--dataset_path", required=True, type=str, help="HDF5 dataset to convert")
+@click.option("--output", required=True, type=str, help="Folder of the columnar store")
+@click.option(
+    "--batteries",
+    default=None,
+    type=str,
+    help="Comma separated batteries to convert, all of them by default",
+)
+@click.option("--repeat", default=3, type=int, help="Repetitions of the timed reads")
+def main(dataset_path, output, batteries, repeat):
+    """
+    Converts an HDF5 dataset with one group per cycle to the columnar store read by
+    DatasetEV when BMO_COLUMNAR_PATH is set, then checks it against the HDF5 groups
+    and compares the time to read a cycle and to select one of its steps.
+    """
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    converted = convert(
+        dataset_path, output, batteries.split(",") if batteries else None
+    )
+    if not converted:
+        print(f"No cycles found in {dataset_path}", file=sys.stderr)
+        sys.exit(1)
+    print(
+        f"{'battery':>8} {'cycles':>7} {'mismatch':>8} {'h5 [ms]':>8} "
+        f"{'npy [ms]':>8} {'mask [us]':>9} {'slice [us]':>10}"
+    )
+    for battery in converted:
+        row = check_battery(dataset_path, output, battery, repeat)
+        print(
+            f"{row['battery']:>8} {row['cycles']:>7} {row['mismatches']:>8} "
+            f"{row['h5_ms']:>8.3f} {row['columnar_ms']:>8.3f} "
+            f"{row['mask_us']:>9.1f} {row['slice_us']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+import multiprocessing
+import os
+import shlex
+import sys
+import tempfile
+import time
+
+import click
+from BMO_Batch import parse_experiment
+
+DEFAULT_VARIANTS = ";".join(
+    [
+        "--drive_cycle_mode tiled",
+        "--drive_cycle_mode periodic",
+        "--drive_cycle_mode periodic --drive_cycle_tolerance 0.05",
+        "--drive_cycle_mode periodic --drive_cycle_tolerance 0.05 "
+        "--drive_cycle_sampling 10",
+    ]
+)
+
+
+def run_variant(kwargs, name, inputs_path, results_queue):
+    """
+    Runs the first cycle with one drive cycle representation in a fresh process and
+    reports the wall and solver time of the main experiment, the size of its
+    solution and the metrics comparing it with the dataset.
+    """
+    from core.environment import setup_paths
+    from core.ModelState import LeanState, StateModel
+    from core.SimulationRunner import initialize_pybamm_wrapper
+    from core.utils import PybammOutput
+
+    os.environ["BMO_BENCHMARK_INPUTS"] = inputs_path
+    kwargs = dict(
+        kwargs,
+        inputs_path="BMO_BENCHMARK_INPUTS",
+        cache_path=None,
+        save_param=False,
+    )
+    _, parameter_file_path, result_path, state_path, _ = setup_paths(kwargs)
+    results = {"variant": name, "error": None}
+    try:
+        _, pybamm_wrapper = initialize_pybamm_wrapper(
+            parameter_file_path, result_path, state_path, kwargs
+        )
+        solution_init = pybamm_wrapper.run_experiment(
+            experiment=pybamm_wrapper.experiments.init, last_state=None, initial_soc=1
+        )
+        pybamm_wrapper.state = StateModel(None, LeanState.from_solution(solution_init))
+        solution_capacity = pybamm_wrapper.run_test_capacity()
+        pybamm_wrapper.update_discharge_capacity(solution_capacity)
+
+        start = time.perf_counter()
+        solution = pybamm_wrapper.run_experiment(
+            experiment=pybamm_wrapper.experiments.main,
+            last_state=pybamm_wrapper.state.last_ModelState,
+            initial_soc=None,
+        )
+        results["wall"] = time.perf_counter() - start
+        if not pybamm_wrapper.success:
+            raise RuntimeError("main experiment failed")
+        results["solve"] = solution.solve_time.value
+        results["points"] = len(solution.t)
+        # States are float64, stored as numpy arrays or CasADi matrices
+        results["size_mb"] = (
+            sum(8 * y.shape[0] * y.shape[1] for y in solution.all_ys) / 1e6
+        )
+        output = PybammOutput(solution)
+        dataset = pybamm_wrapper.dataset
+        results["linear"] = dataset.__metric_linear__(0, output)
+        results["rmse"] = dataset.__metric_rmse__(0, output)
+    except Exception as e:
+        results["error"] = str(e)
+    results_queue.put(results)
+
+
+def benchmark_variant(kwargs, name, inputs_path):
+    # Spawned processes start without the simulations built by other variants
+    context = multiprocessing.get_context("spawn")
+    results_queue = context.Queue()
+    process = context.Process(
+        target=run_variant, args=(kwargs, name, inputs_path, results_queue)
+    )
+    process.start()
+    results = results_queue.get()
+    process.join()
+    return results
+
+
+@click.command()
+@click.option(
+    "--experiment",
+    required=True,
+    type=str,
+    help="BMO_CLI.py arguments of the configuration to simulate",
+)
+@click.option(
+    "--variants",
+    default=DEFAULT_VARIANTS,
+    help="Semicolon separated drive cycle options of each variant, the first one "
+    "is the reference",
+)
+def main(experiment, variants):
+    """
+    Solves the main experiment of the first cycle of a configuration with every drive
+    cycle representation and reports its solve time, solution size, and the deviation
+    of the linear fit and RMSE metrics from the reference variant.
+    """
+    inputs_path = tempfile.mkdtemp(prefix="bmo_drive_cycle_benchmark_")
+    rows = []
+    for index, variant in enumerate(variants.split(";")):
+        kwargs = parse_experiment(shlex.split(experiment) + shlex.split(variant))
+        if kwargs is None:
+            sys.exit(1)
+        kwargs["id_configuration"] = f"{kwargs['id_configuration']}_variant{index}"
+        rows.append(benchmark_variant(kwargs, variant, inputs_path))
+
+    reference = rows[0]
+    print(
+        f"{'variant':>4} {'wall [s]':>9} {'solve [s]':>9} {'points':>7} "
+        f"{'size [MB]':>9} {'linear':>10} {'d_linear':>9} {'rmse':>10} {'d_rmse':>9}"
+    )
+    for index, row in enumerate(rows):
+        if row["error"] is not None:
+            print(f"{index:>4} FAILED {row['error']}")
+            continue
+        d_linear, d_rmse = (
+            (abs(row[key] - reference[key]) for key in ["linear", "rmse"])
+            if reference["error"] is None
+            else (float("nan"), float("nan"))
+        )
+        print(
+            f"{index:>4} {row['wall']:>9.2f} {row['solve']:>9.2f} {row['points']:>7} "
+            f"{row['size_mb']:>9.2f} {row['linear']:>10.4g} {d_linear:>9.3g} "
+            f"{row['rmse']:>10.4g} {d_rmse:>9.3g}"
+        )
+    print()
+    for index, row in enumerate(rows):
+        print(f"{index:>4}: {row['variant']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import multiprocessing
+import os
+import shlex
+import sys
+import tempfile
+import time
+
+import click
+from BMO_Batch import parse_experiment
+
+EXPERIMENTS = ("init", "capacity")
+INITIAL_SOC = {"init": 1, "capacity": 1}
+
+
+def time_startup(kwargs, cache_path, results_queue):
+    """
+    Builds the wrapper and the simulation of every experiment in a fresh process,
+    as a new evaluation does, and reports how long each step took.
+    """
+    from core.environment import setup_paths
+    from core.SimulationRunner import initialize_pybamm_wrapper
+
+    os.environ["BMO_BENCHMARK_CACHE"] = cache_path
+    kwargs = dict(kwargs, cache_path="BMO_BENCHMARK_CACHE", save_param=False)
+    _, parameter_file_path, result_path, state_path, _ = setup_paths(kwargs)
+    timings = {}
+    start = time.perf_counter()
+    _, pybamm_wrapper = initialize_pybamm_wrapper(
+        parameter_file_path, result_path, state_path, kwargs
+    )
+    timings["wrapper"] = time.perf_counter() - start
+    for name in EXPERIMENTS:
+        start = time.perf_counter()
+        pybamm_wrapper.get_simulation(
+            getattr(pybamm_wrapper.experiments, name), INITIAL_SOC[name]
+        )
+        timings[name] = time.perf_counter() - start
+    results_queue.put(timings)
+
+
+def run_startup(kwargs, cache_path):
+    # Spawned processes start without the simulations built by previous runs
+    context = multiprocessing.get_context("spawn")
+    results_queue = context.Queue()
+    process = context.Process(
+        target=time_startup, args=(kwargs, cache_path, results_queue)
+    )
+    process.start()
+    timings = results_queue.get()
+    process.join()
+    return timings
+
+
+@click.command()
+@click.option(
+    "--experiment",
+    required=True,
+    type=str,
+    help="BMO_CLI.py arguments of the configuration to build",
+)
+@click.option("--cache_path", default=None, type=str, help="Model cache folder")
+def main(experiment, cache_path):
+    """
+    Compares the startup of an evaluation with an empty model cache (cold) and with
+    the simulations cached by the first run (warm).
+    """
+    kwargs = parse_experiment(shlex.split(experiment))
+    if kwargs is None:
+        sys.exit(1)
+    cache_path = cache_path or tempfile.mkdtemp(prefix="bmo_model_cache_")
+    cold = run_startup(kwargs, cache_path)
+    warm = run_startup(kwargs, cache_path)
+    print(f"{'stage':>10} {'cold [s]':>10} {'warm [s]':>10}")
+    for name in ("wrapper",) + EXPERIMENTS:
+        print(f"{name:>10} {cold[name]:>10.3f} {warm[name]:>10.3f}")
+    print(f"{'total':>10} {sum(cold.values()):>10.3f} {sum(warm.values()):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import logging
+import os
+import sys
+import time
+
+import click
+from BMO_Batch import parse_experiment, read_experiments, run_batch
+from core.environment import MAX_VALUE
+from core.Placement import PlacementPolicy
+
+
+def parse_splits(splits):
+    """
+    Parses "workersxthreads" pairs, e.g. "8x1,4x2,2x4".
+    """
+    parsed = []
+    for split in splits.split(","):
+        workers, threads = split.lower().split("x")
+        parsed.append((int(workers), int(threads)))
+    return parsed
+
+
+def get_benchmark_experiments(experiments, split_name):
+    """
+    Gives every experiment a configuration id of its own for this split and disables
+    the simulation cache, so no split reuses the cycles simulated by another one.
+    """
+    benchmark_experiments = []
+    for kwargs in experiments:
+        if kwargs is None:
+            continue
+        kwargs = dict(kwargs)
+        kwargs["id_configuration"] = f"{kwargs['id_configuration']}_bench_{split_name}"
+        kwargs["cache_path"] = None
+        benchmark_experiments.append(kwargs)
+    return benchmark_experiments
+
+
+@click.command()
+@click.option(
+    "--experiments_file",
+    required=True,
+    type=str,
+    help="File with one BMO_CLI.py argument line per experiment (text or JSON)",
+)
+@click.option(
+    "--splits",
+    default=f"{os.cpu_count()}x1",
+    help="Comma separated workersxthreads splits to compare, e.g. 8x1,4x2,2x4",
+)
+@click.option(
+    "--pin_cores", default=True, type=bool, help="Bind every worker to its own cores"
+)
+@click.option("--log_path", default=None, type=str, help="Benchmark log file")
+def main(experiments_file, splits, pin_cores, log_path):
+    """
+    Runs the same race step with several workers x threads splits of this node and
+    reports the evaluations per hour of each one.
+    """
+    logging.basicConfig(
+        filename=log_path,
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+    experiments = [parse_experiment(args) for args in read_experiments(experiments_file)]
+    rows = []
+    for workers, threads in parse_splits(splits):
+        split_name = f"{workers}x{threads}"
+        policy = PlacementPolicy(threads=threads, pin_cores=pin_cores)
+        benchmark_experiments = get_benchmark_experiments(experiments, split_name)
+        start = time.perf_counter()
+        results = run_batch(benchmark_experiments, workers, policy)
+        elapsed = time.perf_counter() - start
+        failed = sum(result == MAX_VALUE for result in results)
+        throughput = len(results) * 3600 / elapsed
+        rows.append((split_name, len(results), failed, elapsed, throughput))
+
+    sys.stdout = sys.__stdout__
+    print(f"{'split':>8} {'evals':>6} {'failed':>6} {'seconds':>10} {'evals/hour':>11}")
+    for split_name, evaluations, failed, elapsed, throughput in rows:
+        print(
+            f"{split_name:>8} {evaluations:>6} {failed:>6} {elapsed:>10.1f} {throughput:>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
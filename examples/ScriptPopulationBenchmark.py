@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import click
+from BMO_Batch import parse_experiment, read_experiments, run_batch
+from core.environment import setup_paths
+from core.MetricsIndex import lookup_metric
+
+INPUTS_ENV = "BMO_BENCHMARK_INPUTS"
+
+
+def get_benchmark_experiments(experiments, cycles, inputs_path):
+    """
+    Copies the experiments to simulate their first cycles in a fresh inputs folder,
+    without the cache, so both modes solve every cycle.
+    """
+    os.environ[INPUTS_ENV] = inputs_path
+    return [
+        dict(
+            kwargs,
+            n_cycle=cycles - 1,
+            inputs_path=INPUTS_ENV,
+            cache_path=None,
+            save_param=False,
+        )
+        for kwargs in experiments
+    ]
+
+
+def get_batch_cost(kwargs, cycles):
+    """
+    Mean metric of the cycles an experiment of the batch simulated, from its index.
+    """
+    state_path = setup_paths(kwargs)[3]
+    metrics = [lookup_metric(state_path, cycle) for cycle in range(cycles)]
+    if not all(simulated and metric is not None for simulated, metric in metrics):
+        return float("inf")
+    return sum(metric for _, metric in metrics) / cycles
+
+
+def run_population(experiments, cycles):
+    from core import ModelParameters
+    from core.PyBammWrapper import load_parameter_values
+    from core.SimulationRunner import initialize_pybamm_wrapper
+
+    population = [
+        ModelParameters.ModelParameters(
+            file_path=kwargs.get("base_param_path"),
+            external_param=load_parameter_values(),
+            **kwargs,
+        )
+        for kwargs in experiments
+    ]
+    _, parameter_file_path, result_path, state_path, _ = setup_paths(experiments[0])
+    _, pybamm_wrapper = initialize_pybamm_wrapper(
+        parameter_file_path, result_path, state_path, experiments[0]
+    )
+    return pybamm_wrapper.evaluate_population(
+        population, pybamm_wrapper.id_battery, cycles
+    )
+
+
+@click.command()
+@click.option(
+    "--experiments_file",
+    required=True,
+    type=str,
+    help="File with one BMO_CLI.py argument line per configuration of the population",
+)
+@click.option("--cycles", default=1, type=int, help="Cycles simulated per configuration")
+@click.option("--log_path", default=None, type=str, help="Benchmark log file")
+def main(experiments_file, cycles, log_path):
+    """
+    Evaluates a population on a single core twice: one process per configuration as
+    BMO_Batch.py does, then in one process with PyBammWrapper.evaluate_population.
+    Reports the cost of every configuration in both modes and their throughput.
+    The configurations must share the battery and dataset.
+    """
+    logging.basicConfig(
+        filename=log_path,
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+    experiments = [parse_experiment(args) for args in read_experiments(experiments_file)]
+    if not experiments or None in experiments:
+        sys.exit(1)
+
+    # The batch runs first, so its workers don't inherit the population's simulations
+    batch_experiments = get_benchmark_experiments(
+        experiments, cycles, tempfile.mkdtemp(prefix="bmo_population_batch_")
+    )
+    start = time.perf_counter()
+    run_batch(batch_experiments, workers=1)
+    batch_time = time.perf_counter() - start
+    batch_costs = [get_batch_cost(kwargs, cycles) for kwargs in batch_experiments]
+
+    population_experiments = get_benchmark_experiments(
+        experiments, cycles, tempfile.mkdtemp(prefix="bmo_population_")
+    )
+    start = time.perf_counter()
+    population_costs = run_population(population_experiments, cycles)
+    population_time = time.perf_counter() - start
+
+    sys.stdout = sys.__stdout__
+    print(f"{'configuration':>20} {'batch':>12} {'population':>12} {'deviation':>10}")
+    for kwargs, batch_cost, population_cost in zip(
+        experiments, batch_costs, population_costs
+    ):
+        print(
+            f"{kwargs['id_configuration']:>20} {batch_cost:>12.6g} "
+            f"{population_cost:>12.6g} {abs(batch_cost - population_cost):>10.3g}"
+        )
+    n = len(experiments)
+    print(f"\n{'mode':>12} {'wall [s]':>9} {'evals/s':>8}")
+    print(f"{'batch':>12} {batch_time:>9.2f} {n / batch_time:>8.3f}")
+    print(f"{'population':>12} {population_time:>9.2f} {n / population_time:>8.3f}")
+    print(f"\nSpeed-up: {batch_time / population_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import logging
+import math
+import os
+import sys
+
+import click
+import pandas as pd
+from BMO_Batch import parse_experiment, read_experiments, run_batch
+from core.Fidelity import (
+    FIDELITY_HIGH,
+    FIDELITY_SPME,
+    PRESCREEN_THRESHOLD_ENV,
+)
+from scipy.stats import spearmanr
+
+
+def get_fidelity_experiments(experiments, fidelity):
+    """
+    Copies the experiments to evaluate them at the given fidelity, without pre-screen.
+    """
+    return [
+        dict(kwargs, fidelity=fidelity, prescreen_threshold=None)
+        for kwargs in experiments
+        if kwargs is not None
+    ]
+
+
+def to_cost(result):
+    cost = float(result)
+    return None if math.isinf(cost) or math.isnan(cost) else cost
+
+
+def get_rank_correlation(df):
+    valid = df.dropna()
+    if len(valid) < 3:
+        return len(valid), float("nan"), float("nan")
+    rho, p_value = spearmanr(valid["spme"], valid["dfn"])
+    return len(valid), rho, p_value
+
+
+@click.command()
+@click.option(
+    "--experiments_file",
+    required=True,
+    type=str,
+    help="File with one BMO_CLI.py argument line per experiment (text or JSON)",
+)
+@click.option(
+    "--workers", default=os.cpu_count(), type=int, help="Evaluations run in parallel"
+)
+@click.option(
+    "--reference",
+    default=FIDELITY_HIGH,
+    type=click.Choice(["low", "high"], case_sensitive=False),
+    help="DFN fidelity the SPMe costs are compared with",
+)
+@click.option(
+    "--thresholds",
+    default=None,
+    type=str,
+    help="Comma separated pre-screen thresholds to assess, e.g. 1,2,5",
+)
+@click.option("--output", default=None, type=str, help="CSV file with every cost")
+@click.option("--log_path", default=None, type=str, help="Calibration log file")
+def main(experiments_file, workers, reference, thresholds, output, log_path):
+    """
+    Evaluates every experiment with the SPMe and with the DFN, and reports how well
+    their costs rank-correlate (Spearman) per battery and overall. For each given
+    threshold, it also reports the share of configurations the pre-screen rejects
+    and how many of the best DFN quartile it would have wrongly rejected.
+    """
+    logging.basicConfig(
+        filename=log_path,
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+    # The calibration evaluates both models, whatever the pre-screen of the campaign
+    os.environ.pop(PRESCREEN_THRESHOLD_ENV, None)
+    experiments = [
+        kwargs
+        for kwargs in (parse_experiment(args) for args in read_experiments(experiments_file))
+        if kwargs is not None
+    ]
+    if not experiments:
+        sys.exit(1)
+    spme_results = run_batch(get_fidelity_experiments(experiments, FIDELITY_SPME), workers)
+    dfn_results = run_batch(get_fidelity_experiments(experiments, reference), workers)
+
+    df = pd.DataFrame(
+        {
+            "configuration": [kwargs["id_configuration"] for kwargs in experiments],
+            "instance": [kwargs["id_instance"] for kwargs in experiments],
+            "battery": [kwargs["battery_id"] for kwargs in experiments],
+            "cycle": [kwargs["n_cycle"] for kwargs in experiments],
+            "spme": [to_cost(result) for result in spme_results],
+            "dfn": [to_cost(result) for result in dfn_results],
+        }
+    )
+    if output:
+        df.to_csv(output, index=False)
+
+    sys.stdout = sys.__stdout__
+    print(f"{'battery':>8} {'n':>5} {'failed':>6} {'spearman':>9} {'p-value':>9}")
+    groups = [(battery, df_battery) for battery, df_battery in df.groupby("battery")]
+    for battery, df_battery in groups + [("all", df)]:
+        n, rho, p_value = get_rank_correlation(df_battery[["spme", "dfn"]])
+        failed = len(df_battery) - n
+        print(f"{battery:>8} {n:>5} {failed:>6} {rho:>9.3f} {p_value:>9.3g}")
+
+    if thresholds:
+        valid = df.dropna(subset=["dfn"])
+        best = valid["dfn"] <= valid["dfn"].quantile(0.25)
+        print(f"\n{'threshold':>10} {'rejected_%':>10} {'best_rejected':>13}")
+        for threshold in (float(value) for value in thresholds.split(",")):
+            rejected = df["spme"].isna() | (df["spme"] > threshold)
+            best_rejected = (rejected[valid.index] & best).sum()
+            print(
+                f"{threshold:>10g} {100 * rejected.mean():>10.1f} "
+                f"{best_rejected:>6}/{best.sum():<6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
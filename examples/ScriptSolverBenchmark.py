@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+import multiprocessing
+import os
+import shlex
+import sys
+import tempfile
+import time
+
+import click
+from BMO_Batch import parse_experiment
+
+
+def run_solver(kwargs, solver_name, inputs_path, results_queue):
+    """
+    Runs the init, capacity and main experiments of the first cycle with one solver
+    in a fresh process and reports the wall time, solver time and time steps of each.
+    """
+    from core.environment import setup_paths
+    from core.ModelState import LeanState, StateModel
+    from core.SimulationRunner import initialize_pybamm_wrapper
+
+    os.environ["BMO_BENCHMARK_INPUTS"] = inputs_path
+    kwargs = dict(
+        kwargs,
+        id_configuration=f"{kwargs['id_configuration']}_solver_{solver_name}",
+        inputs_path="BMO_BENCHMARK_INPUTS",
+        cache_path=None,
+        save_param=False,
+        solver=solver_name,
+    )
+    _, parameter_file_path, result_path, state_path, _ = setup_paths(kwargs)
+    results = {"solver": solver_name, "experiments": {}, "metric": None, "error": None}
+    try:
+        _, pybamm_wrapper = initialize_pybamm_wrapper(
+            parameter_file_path, result_path, state_path, kwargs
+        )
+
+        def timed_run(name, run):
+            start = time.perf_counter()
+            solution = run()
+            results["experiments"][name] = {
+                "wall": time.perf_counter() - start,
+                "solve": solution.solve_time.value,
+                "steps": len(solution.t),
+            }
+            if not pybamm_wrapper.success:
+                raise RuntimeError(f"{name} experiment failed")
+            return solution
+
+        solution_init = timed_run(
+            "init",
+            lambda: pybamm_wrapper.run_experiment(
+                experiment=pybamm_wrapper.experiments.init,
+                last_state=None,
+                initial_soc=1,
+            ),
+        )
+        pybamm_wrapper.state = StateModel(None, LeanState.from_solution(solution_init))
+        solution_capacity = timed_run("capacity", pybamm_wrapper.run_test_capacity)
+        pybamm_wrapper.update_discharge_capacity(solution_capacity)
+        solution = timed_run(
+            "main",
+            lambda: pybamm_wrapper.run_experiment(
+                experiment=pybamm_wrapper.experiments.main,
+                last_state=pybamm_wrapper.state.last_ModelState,
+                initial_soc=None,
+            ),
+        )
+        pybamm_wrapper.update_state_with_solution(solution, solution_capacity, 0)
+        results["metric"] = pybamm_wrapper.extract_metric(0)
+    except Exception as e:
+        results["error"] = str(e)
+    results_queue.put(results)
+
+
+def benchmark_solver(kwargs, solver_name, inputs_path):
+    # Spawned processes start without the simulations built by other solvers
+    context = multiprocessing.get_context("spawn")
+    results_queue = context.Queue()
+    process = context.Process(
+        target=run_solver, args=(kwargs, solver_name, inputs_path, results_queue)
+    )
+    process.start()
+    results = results_queue.get()
+    process.join()
+    return results
+
+
+@click.command()
+@click.option(
+    "--experiment",
+    required=True,
+    type=str,
+    help="BMO_CLI.py arguments of the configuration to simulate",
+)
+@click.option(
+    "--solvers",
+    default="casadi_safe,casadi_fast_events,idaklu",
+    help="Comma separated solvers to compare, the first one is the reference",
+)
+def main(experiment, solvers):
+    """
+    Runs the first cycle of a configuration with every solver and reports the wall
+    time, time steps and failures of each experiment, and the deviation of the
+    metric from the reference solver.
+    """
+    kwargs = parse_experiment(shlex.split(experiment))
+    if kwargs is None:
+        sys.exit(1)
+    inputs_path = tempfile.mkdtemp(prefix="bmo_solver_benchmark_")
+    rows = [
+        benchmark_solver(kwargs, solver_name, inputs_path)
+        for solver_name in solvers.split(",")
+    ]
+
+    reference = rows[0]["metric"]
+    print(
+        f"{'solver':>20} {'experiment':>10} {'wall [s]':>9} {'solve [s]':>9} {'steps':>7}"
+    )
+    for row in rows:
+        for name, timings in row["experiments"].items():
+            print(
+                f"{row['solver']:>20} {name:>10} {timings['wall']:>9.3f} "
+                f"{timings['solve']:>9.3f} {timings['steps']:>7}"
+            )
+    print(f"\n{'solver':>20} {'metric':>12} {'deviation':>10} {'status':>8}")
+    for row in rows:
+        if row["error"] is not None:
+            print(f"{row['solver']:>20} {'-':>12} {'-':>10} {'FAILED':>8} {row['error']}")
+            continue
+        deviation = (
+            abs(row["metric"] - reference) if reference is not None else float("nan")
+        )
+        print(f"{row['solver']:>20} {row['metric']:>12.6g} {deviation:>10.3g} {'OK':>8}")
+
+
+if __name__ == "__main__":
+    main()
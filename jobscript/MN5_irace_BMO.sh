@@ -76,9 +76,16 @@ conda info --envs
 # Tell R where to find R_LIBS_USER
 # Use the following line only if local installation was forced
 export OMP_NUM_THREADS=1
+export BMO_THREADS_PER_EVALUATION=1
 ulimit -s unlimited
 export SBATCH_OVERCOMMIT=1
 export FI_PROVIDER=verbs
+# One simulation daemon per node keeps PyBaMM and the models warm for BMO_CLI.py
+export BMO_DAEMON_SOCKET="/tmp/bmo_daemon_\${SLURM_JOB_ID}.sock"
+srun --overlap --nodes=\$SLURM_JOB_NUM_NODES --ntasks-per-node=1 ./BMO_Daemon.py $DAEMON_OPTIONS &
+# The socket appears once the daemon is warm; wait for it on every node, so the first
+# evaluations are not silently run cold in their own process
+srun --overlap --nodes=\$SLURM_JOB_NUM_NODES --ntasks-per-node=1 bash -c 'for i in \$(seq $DAEMON_WAIT); do [ -S "\$BMO_DAEMON_SOCKET" ] && exit 0; sleep 1; done; echo "No simulation daemon on \$(hostname)" >&2; exit 1' || echo "Simulation daemon not ready after $DAEMON_WAIT s, evaluations run locally" >&2
 
 mpirun -n 1 $IRACE_HOME/bin/irace --log-file $BASE_LOG_FILE --mpi 1 --scenario=$SCENARIE_FILE --parallel=$NB_SLAVES $PARAM_OPTION --seed $SEED $RECOVERY_OPTION $PARAMS 
 EOF
@@ -140,14 +147,22 @@ fi
 #   load_param
 # fi
 echo $MODE
+INSTANCES_FILE=""
 case "$MODE" in
-    "DB") SCENARIE_FILE="scenaries/scenaries_degradation_base.txt";;
-    "DF") SCENARIE_FILE="scenaries/scenaries_degradation.txt";;
-    "ALL") SCENARIE_FILE="scenaries/scenaries_all.txt";;
+    "DB") SCENARIE_FILE="scenaries/scenaries_degradation_base.txt"; INSTANCES_FILE="instances/instances-list_degradation_base.txt";;
+    "DF") SCENARIE_FILE="scenaries/scenaries_degradation.txt"; INSTANCES_FILE="instances/instances-list_degradation.txt";;
+    "ALL") SCENARIE_FILE="scenaries/scenaries_all.txt"; INSTANCES_FILE="instances/instances-list_all.txt";;
     "SIMPLE")SCENARIE_FILE="scenaries/scenaries_simple.txt";; 
-    "ND")    SCENARIE_FILE="scenaries/scenaries_non_degradation.txt";;
+    "ND")    SCENARIE_FILE="scenaries/scenaries_non_degradation.txt"; INSTANCES_FILE="instances/instances-list_non_degradation.txt";;
     *) usage;;
   esac
+# The daemon warms up the experiments, data and simulations of the scenario instances
+DAEMON_OPTIONS=""
+if [ -n "$INSTANCES_FILE" ]; then
+  DAEMON_OPTIONS="--instances_file $INSTANCES_FILE"
+fi
+# Seconds to wait for the daemons to be warm before starting irace
+DAEMON_WAIT=1800
 
 if [ "$DEBUG_MODE" -eq 1 ]; then
   TIME="02:00:00"